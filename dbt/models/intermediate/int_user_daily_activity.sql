@@ -0,0 +1,137 @@
+-- Logic:
+-- 1. Grain: one row per (user_id, activity_date) with any order or event by a registered user
+--    (guest events with a NULL user_id are dropped, as in the bitmap retention and A/B readers).
+-- 2. Additive daily counters, so any window (30d, 60d, all-time) is a SUM over days:
+--    * orders_placed: all statuses; order_count / spend / first+last order time: excluding Returned & Cancelled.
+--    * event counts by type.
+--    * sessions_started: each session is counted once, on the day of its first event, so summing
+--      days before a cutoff equals count(distinct session_id) of events before that cutoff.
+-- 3. Incremental: only the last var('activity_lookback_days') days (plus today) are recomputed,
+--    which absorbs late events and recent order status changes.
+
+{{
+    config(
+        materialized='incremental',
+        unique_key=['user_id', 'activity_date'],
+        incremental_strategy='delete+insert',
+        indexes=[
+            {'columns': ['user_id', 'activity_date'], 'unique': True},
+            {'columns': ['activity_date']}
+        ]
+    )
+}}
+
+{% set since %}
+(select max(activity_date) - {{ var('activity_lookback_days') }} from {{ this }})
+{% endset %}
+
+with orders as (
+    select *
+    from {{ ref('stg_orders') }}
+    -- Guest activity has no user_id; keys must be non-null for delete+insert to replace rows
+    where user_id is not null
+    {% if is_incremental() %}
+    and created_at >= {{ since }}
+    {% endif %}
+),
+
+events as (
+    select *
+    from {{ ref('stg_events') }}
+    where user_id is not null
+    {% if is_incremental() %}
+    and created_at >= {{ since }}
+    {% endif %}
+),
+
+daily_orders as (
+    select
+        user_id,
+        created_at::date as activity_date,
+        count(distinct order_id) as orders_placed,
+        count(distinct case when status not in ('Returned', 'Cancelled') then order_id end) as order_count,
+        min(case when status not in ('Returned', 'Cancelled') then created_at end) as first_order_at,
+        max(case when status not in ('Returned', 'Cancelled') then created_at end) as last_order_at
+    from orders
+    group by 1, 2
+),
+
+daily_spend as (
+    select
+        oi.user_id,
+        o.created_at::date as activity_date,
+        sum(oi.sale_price) as spend
+    from {{ ref('stg_order_items') }} oi
+    join orders o on oi.order_id = o.order_id
+    where o.status not in ('Returned', 'Cancelled')
+    group by 1, 2
+),
+
+daily_events as (
+    select
+        user_id,
+        created_at::date as activity_date,
+        count(*) as event_count,
+        count(case when event_type = 'product' then 1 end) as view_count,
+        count(case when event_type = 'cart' then 1 end) as cart_count,
+        count(case when event_type = 'purchase' then 1 end) as purchase_event_count
+    from events
+    group by 1, 2
+),
+
+session_starts as (
+    -- Start time over ALL events of a session, so sessions spanning the lookback edge are not recounted
+    select
+        user_id,
+        min(created_at)::date as activity_date
+    from {{ ref('stg_events') }}
+    where user_id is not null
+    {% if is_incremental() %}
+    and session_id in (select session_id from events)
+    {% endif %}
+    group by session_id, user_id
+),
+
+daily_sessions as (
+    select
+        user_id,
+        activity_date,
+        count(*) as sessions_started
+    from session_starts
+    {% if is_incremental() %}
+    where activity_date >= {{ since }}
+    {% endif %}
+    group by 1, 2
+),
+
+activity_keys as (
+    select user_id, activity_date from daily_orders
+    union
+    select user_id, activity_date from daily_events
+    union
+    select user_id, activity_date from daily_sessions
+)
+
+select
+    k.user_id,
+    k.activity_date,
+
+    -- Orders
+    coalesce(o.orders_placed, 0) as orders_placed,
+    coalesce(o.order_count, 0) as order_count,
+    o.first_order_at,
+    o.last_order_at,
+    coalesce(s.spend, 0) as spend,
+
+    -- Engagement
+    coalesce(e.event_count, 0) as event_count,
+    coalesce(e.view_count, 0) as view_count,
+    coalesce(e.cart_count, 0) as cart_count,
+    coalesce(e.purchase_event_count, 0) as purchase_event_count,
+    coalesce(ds.sessions_started, 0) as sessions_started
+
+from activity_keys k
+left join daily_orders o on k.user_id = o.user_id and k.activity_date = o.activity_date
+left join daily_spend s on k.user_id = s.user_id and k.activity_date = s.activity_date
+left join daily_events e on k.user_id = e.user_id and k.activity_date = e.activity_date
+left join daily_sessions ds on k.user_id = ds.user_id and k.activity_date = ds.activity_date
@@ -1,6 +1,29 @@
+{{
+    config(
+        materialized='incremental',
+        unique_key='session_id',
+        incremental_strategy='delete+insert',
+        indexes=[
+            {'columns': ['session_id'], 'unique': True},
+            {'columns': ['user_id']},
+            {'columns': ['session_start_at']},
+            {'columns': ['dbt_updated_at']}
+        ]
+    )
+}}
+
 with events as (
 
     select * from {{ ref('stg_events') }}
+    {% if is_incremental() %}
+    -- Re-aggregate every session that received events inside the lookback window,
+    -- so late-arriving events update the whole session instead of creating a partial duplicate.
+    where session_id in (
+        select session_id
+        from {{ ref('stg_events') }}
+        where created_at >= (select max(session_end_at) from {{ this }}) - interval '{{ var("sessions_lookback_hours") }} hours'
+    )
+    {% endif %}
 
 ),
 
@@ -31,5 +54,7 @@ session_agg as (
 
 select 
     *,
-    {{ dbt.datediff("session_start_at", "session_end_at", "second") }} as session_duration_seconds
+    {{ dbt.datediff("session_start_at", "session_end_at", "second") }} as session_duration_seconds,
+    -- Build watermark used by the incremental downstream marts
+    current_timestamp as dbt_updated_at
 from session_agg
@@ -1,25 +1,46 @@
-with sessions as (
+{{
+    config(
+        materialized='incremental',
+        unique_key='traffic_source',
+        incremental_strategy='delete+insert'
+    )
+}}
 
-    select * from {{ ref('fct_sessions') }}
+-- Rollup of the mart_funnel_daily cube (session_id is unique in fct_sessions, so summing
+-- the cube's session counts equals count(distinct session_id)).
+
+with cube as (
+
+    select * from {{ ref('mart_funnel_daily') }}
+    {% if is_incremental() %}
+    -- Only traffic sources whose cube rows were rebuilt with updated sessions since the last run
+    where traffic_source in (
+        select distinct traffic_source
+        from {{ ref('mart_funnel_daily') }}
+        where source_updated_at > (select max(source_updated_at) from {{ this }})
+    )
+    {% endif %}
 
 )
 
 select
     -- Dimesion
     traffic_source,
-    
+
     -- Funnel Steps (Aggregated)
-    count(distinct session_id) as total_sessions,
-    sum(has_product_view) as sessions_with_view,
-    sum(has_add_to_cart) as sessions_with_cart,
-    sum(has_purchase) as sessions_with_purchase,
-    
+    sum(total_sessions) as total_sessions,
+    sum(sessions_with_view) as sessions_with_view,
+    sum(sessions_with_cart) as sessions_with_cart,
+    sum(sessions_with_purchase) as sessions_with_purchase,
+
     -- Conversion Rates (Calculated in BI usually, but good to have pre-calculated too)
-    sum(has_product_view) * 1.0 / count(distinct session_id) as view_rate,
-    sum(has_add_to_cart) * 1.0 / nullif(sum(has_product_view),0) as cart_add_rate,
-    sum(has_purchase) * 1.0 / nullif(sum(has_add_to_cart),0) as purchase_rate,
-    sum(has_purchase) * 1.0 / count(distinct session_id) as session_conversion_rate
+    sum(sessions_with_view) * 1.0 / sum(total_sessions) as view_rate,
+    sum(sessions_with_cart) * 1.0 / nullif(sum(sessions_with_view),0) as cart_add_rate,
+    sum(sessions_with_purchase) * 1.0 / nullif(sum(sessions_with_cart),0) as purchase_rate,
+    sum(sessions_with_purchase) * 1.0 / sum(total_sessions) as session_conversion_rate,
+
+    max(source_updated_at) as source_updated_at
 
-from sessions
+from cube
 group by 1
 order by 1
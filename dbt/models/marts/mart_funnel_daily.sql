@@ -0,0 +1,51 @@
+{{
+    config(
+        materialized='incremental',
+        unique_key='session_date',
+        incremental_strategy='delete+insert',
+        indexes=[
+            {'columns': ['session_date']},
+            {'columns': ['traffic_source', 'session_date']}
+        ]
+    )
+}}
+
+-- Funnel cube: one row per (session_date, traffic_source, browser, state) with additive counts only.
+-- Any dashboard slice is a SUM over this table; rates are derived at query time, e.g.
+--   sum(sessions_with_purchase) * 1.0 / nullif(sum(total_sessions), 0)
+-- Incremental runs rebuild whole days: every day from the earliest start date of a session
+-- updated in fct_sessions since the last run. Late events only move a session's start earlier,
+-- so its previous day is inside that range as well.
+
+with sessions as (
+
+    select * from {{ ref('fct_sessions') }}
+    {% if is_incremental() %}
+    where session_start_at >= (
+        select min(session_start_at)::date
+        from {{ ref('fct_sessions') }}
+        where dbt_updated_at > (select max(source_updated_at) from {{ this }})
+    )
+    {% endif %}
+
+)
+
+select
+    -- Dimensions
+    session_start_at::date as session_date,
+    traffic_source,
+    browser,
+    state,
+
+    -- Additive funnel counts
+    count(*) as total_sessions,
+    sum(has_product_view) as sessions_with_view,
+    sum(has_add_to_cart) as sessions_with_cart,
+    sum(has_purchase) as sessions_with_purchase,
+    sum(total_events) as total_events,
+    sum(session_duration_seconds) as total_session_seconds,
+
+    max(dbt_updated_at) as source_updated_at
+
+from sessions
+group by 1, 2, 3, 4
@@ -1,9 +1,47 @@
-with user_cohorts as (
+{{
+    config(
+        materialized='incremental',
+        unique_key=['cohort_week', 'period_number'],
+        incremental_strategy='delete+insert'
+    )
+}}
+
+-- Incremental runs only rebuild the cells a new batch of sessions can change:
+--   * every cohort's cell for an affected activity week, and
+--   * every cell of an affected cohort (new users change its initial_users).
+-- Affected weeks = activity weeks of sessions updated in fct_sessions since the last run.
+-- (A late event that moves a user into an EARLIER cohort leaves the old cohort's size stale
+-- until the next --full-refresh.)
+
+with
+
+{% if is_incremental() %}
+
+affected_weeks as (
+    select distinct date_trunc('week', session_start_at)::date as activity_week
+    from {{ ref('fct_sessions') }}
+    where dbt_updated_at > (select max(source_updated_at) from {{ this }})
+),
+
+affected_users as (
+    -- Everyone active in an affected week; this includes every member of an affected cohort
+    select distinct user_id
+    from {{ ref('fct_sessions') }}
+    where session_start_at >= (select min(activity_week) from affected_weeks)
+      and date_trunc('week', session_start_at)::date in (select activity_week from affected_weeks)
+),
+
+{% endif %}
+
+user_cohorts as (
     -- Define the Cohort: When did we first see the user?
     select
         user_id,
         date_trunc('week', min(session_start_at))::date as cohort_week
     from {{ ref('fct_sessions') }}
+    {% if is_incremental() %}
+    where user_id in (select user_id from affected_users)
+    {% endif %}
     group by 1
 ),
 
@@ -13,6 +51,9 @@ user_activities as (
         s.user_id,
         date_trunc('week', s.session_start_at)::date as activity_week
     from {{ ref('fct_sessions') }} s
+    {% if is_incremental() %}
+    where s.user_id in (select user_id from affected_users)
+    {% endif %}
     group by 1, 2
 ),
 
@@ -22,11 +63,15 @@ cohort_activities as (
         uc.user_id,
         uc.cohort_week,
         ua.activity_week,
-        -- Calculate weeks since first seen. 
+        -- Calculate weeks since first seen.
         -- Note: Postgres subtraction of dates gives days. /7 to get weeks.
         (ua.activity_week - uc.cohort_week) / 7 as period_number
     from user_cohorts uc
     join user_activities ua on uc.user_id = ua.user_id
+    {% if is_incremental() %}
+    where ua.activity_week in (select activity_week from affected_weeks)
+       or uc.cohort_week in (select activity_week from affected_weeks)
+    {% endif %}
 ),
 
 cohort_size as (
@@ -35,7 +80,21 @@ cohort_size as (
         cohort_week,
         count(distinct user_id) as cohort_users
     from user_cohorts
+    {% if is_incremental() %}
+    where cohort_week in (select activity_week from affected_weeks)
+    {% endif %}
     group by 1
+
+    {% if is_incremental() %}
+    union all
+
+    -- Cohorts outside the affected weeks keep their size
+    select distinct
+        cohort_week,
+        initial_users as cohort_users
+    from {{ this }}
+    where cohort_week not in (select activity_week from affected_weeks)
+    {% endif %}
 ),
 
 retention_counts as (
@@ -46,6 +105,11 @@ retention_counts as (
         count(distinct user_id) as active_users
     from cohort_activities
     group by 1, 2
+),
+
+watermark as (
+    select max(dbt_updated_at) as source_updated_at
+    from {{ ref('fct_sessions') }}
 )
 
 select
@@ -54,7 +118,9 @@ select
     cs.cohort_users as initial_users,
     rc.active_users,
     -- Retention Rate
-    rc.active_users * 1.0 / cs.cohort_users as retention_rate
+    rc.active_users * 1.0 / cs.cohort_users as retention_rate,
+    w.source_updated_at
 from retention_counts rc
 join cohort_size cs on rc.cohort_week = cs.cohort_week
+cross join watermark w
 order by 1, 2
@@ -8,36 +8,28 @@ with parameters as (
     select '2023-09-01'::timestamp as snapshot_date
 ),
 
-active_users as (
-    -- Users active in the 60 days strict PRIOR to snapshot
-    select distinct user_id
-    from {{ ref('stg_orders') }}
-    cross join parameters p
-    where created_at >= (p.snapshot_date - interval '60 days')
-      and created_at < p.snapshot_date
-      and status not in ('Returned', 'Cancelled')
-),
-
-future_activity as (
-    -- Purchases in the 30 days AFTER snapshot
+user_orders as (
+    -- Pre-aggregated (user_id, day) rollup covering [snapshot - 60d, snapshot + 30d)
     select
-        user_id,
-        count(distinct order_id) as future_orders
-    from {{ ref('stg_orders') }}
+        a.user_id,
+        -- Orders in the 60 days strict PRIOR to snapshot (defines the active universe)
+        sum(case when a.activity_date < p.snapshot_date::date then a.order_count else 0 end) as prior_orders,
+        -- Purchases in the 30 days AFTER snapshot
+        sum(case when a.activity_date >= p.snapshot_date::date then a.order_count else 0 end) as future_orders
+    from {{ ref('int_user_daily_activity') }} a
     cross join parameters p
-    where created_at >= p.snapshot_date
-      and created_at < (p.snapshot_date + interval '30 days')
-      and status not in ('Returned', 'Cancelled')
+    where a.activity_date >= (p.snapshot_date - interval '60 days')::date
+      and a.activity_date < (p.snapshot_date + interval '30 days')::date
     group by 1
 )
 
 select
-    au.user_id,
+    uo.user_id,
     p.snapshot_date,
     case 
-        when coalesce(fa.future_orders, 0) = 0 then 1 -- No Orders = Churned
+        when uo.future_orders = 0 then 1 -- No Orders = Churned
         else 0 -- Orders = Retained
     end as is_churned
-from active_users au
-left join future_activity fa on au.user_id = fa.user_id
+from user_orders uo
 cross join parameters p
+where uo.prior_orders > 0
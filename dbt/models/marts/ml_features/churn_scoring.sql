@@ -7,19 +7,12 @@ with parameters as (
     select '2024-01-17'::timestamp as snapshot_date
 ),
 
-base_orders as (
-    select *
-    from {{ ref('stg_orders') }}
+activity as (
+    -- Pre-aggregated (user_id, day) rollup, strictly BEFORE snapshot_date
+    select a.*
+    from {{ ref('int_user_daily_activity') }} a
     cross join parameters p
-    where created_at < p.snapshot_date
-      and status not in ('Returned', 'Cancelled')
-),
-
-base_events as (
-    select *
-    from {{ ref('stg_events') }}
-    cross join parameters p
-    where created_at < p.snapshot_date
+    where a.activity_date < p.snapshot_date::date
 ),
 
 users as (
@@ -28,36 +21,26 @@ users as (
 
 rfm as (
     select
-        user_id,
-        count(distinct order_id) as frequency_all_time,
-        max(created_at) as last_order_date,
-        min(created_at) as first_order_date
-    from base_orders
-    group by 1
-),
-
-windowed_rfm as (
-    -- Strict 60 Day Window Features
-    select
-        user_id,
-        count(distinct order_id) as frequency_60d,
-        count(distinct case when created_at >= (p.snapshot_date - interval '30 days') then order_id end) as frequency_30d
-    from {{ ref('stg_orders') }}
+        a.user_id,
+        sum(a.order_count) as frequency_all_time,
+        max(a.last_order_at) as last_order_date,
+        min(a.first_order_at) as first_order_date,
+        -- Strict 60 / 30 Day Window Features
+        sum(case when a.activity_date >= (p.snapshot_date - interval '60 days')::date then a.order_count else 0 end) as frequency_60d,
+        sum(case when a.activity_date >= (p.snapshot_date - interval '30 days')::date then a.order_count else 0 end) as frequency_30d
+    from activity a
     cross join parameters p
-    where created_at >= (p.snapshot_date - interval '60 days')
-      and created_at < p.snapshot_date
-      and status not in ('Returned', 'Cancelled')
     group by 1
 ),
 
 engagement as (
     select
         user_id,
-        count(*) as total_events_all_time,
-        count(case when event_type = 'product' then 1 end) as view_count,
-        count(case when event_type = 'cart' then 1 end) as cart_count,
-        count(distinct session_id) as unique_sessions
-    from base_events
+        sum(event_count) as total_events_all_time,
+        sum(view_count) as view_count,
+        sum(cart_count) as cart_count,
+        sum(sessions_started) as unique_sessions
+    from activity
     group by 1
 )
 
@@ -72,8 +55,8 @@ select
     
     -- RFM Features
     coalesce(rfm.frequency_all_time, 0) as frequency_all_time,
-    coalesce(w_rfm.frequency_60d, 0) as frequency_60d,
-    coalesce(w_rfm.frequency_30d, 0) as frequency_30d,
+    coalesce(rfm.frequency_60d, 0) as frequency_60d,
+    coalesce(rfm.frequency_30d, 0) as frequency_30d,
     (EXTRACT(EPOCH FROM (p.snapshot_date - rfm.last_order_date)) / 86400)::int as recency_days,
     (EXTRACT(EPOCH FROM (p.snapshot_date - rfm.first_order_date)) / 86400)::int as tenure_days,
     
@@ -92,6 +75,5 @@ select
 from users u 
 cross join parameters p
 left join rfm on u.user_id = rfm.user_id
-left join windowed_rfm w_rfm on u.user_id = w_rfm.user_id
 left join engagement eng on u.user_id = eng.user_id
 where rfm.frequency_all_time > 0 -- Only score existing customers
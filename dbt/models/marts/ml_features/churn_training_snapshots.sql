@@ -0,0 +1,146 @@
+-- Logic:
+-- 1. Snapshot Dates: a spine from var('churn_snapshot_start') to var('churn_snapshot_end'),
+--    every var('churn_snapshot_interval_days') days (same definitions as churn_features / churn_labels).
+-- 2. Universe per snapshot: users with an order in the 60 days strictly PRIOR to the snapshot.
+-- 3. One pass over the int_user_daily_activity rollup: per-user daily activity is placed on a timeline together
+--    with one marker row per (user, snapshot). Window functions over that timeline read every feature
+--    "as of" the snapshot (running totals for all-time, RANGE windows for 30/60 days) and the label
+--    from the 30 days FOLLOWING it.
+--    Marker rows sit 1 microsecond before the snapshot, so activity ON the snapshot day is excluded
+--    from features and included in the label, exactly like the single-snapshot models.
+-- 4. Incremental: only snapshot dates later than the latest one already materialized are computed.
+
+{{
+    config(
+        materialized='incremental',
+        unique_key=['snapshot_date', 'user_id'],
+        incremental_strategy='delete+insert'
+    )
+}}
+
+with spine as (
+    select generate_series(
+        '{{ var("churn_snapshot_start") }}'::timestamp,
+        '{{ var("churn_snapshot_end") }}'::timestamp,
+        interval '{{ var("churn_snapshot_interval_days") }} days'
+    ) as snapshot_date
+),
+
+new_snapshots as (
+    select snapshot_date
+    from spine
+    {% if is_incremental() %}
+    where snapshot_date > (select coalesce(max(snapshot_date), '1900-01-01'::timestamp) from {{ this }})
+    {% endif %}
+),
+
+bounds as (
+    select max(snapshot_date) as max_snapshot
+    from new_snapshots
+),
+
+daily as (
+    -- Pre-aggregated (user_id, day) rollup. All-time history is needed for
+    -- frequency_all_time / tenure, so there is no lower bound here.
+    select a.*
+    from {{ ref('int_user_daily_activity') }} a
+    cross join bounds b
+    where a.activity_date < (b.max_snapshot + interval '30 days')::date
+),
+
+universe as (
+    select distinct
+        s.snapshot_date,
+        d.user_id
+    from new_snapshots s
+    join daily d
+      on d.activity_date >= (s.snapshot_date - interval '60 days')::date
+     and d.activity_date < s.snapshot_date::date
+    where d.order_count > 0
+),
+
+timeline as (
+    select
+        user_id,
+        activity_date::timestamp as ts,
+        false as is_snapshot,
+        order_count,
+        first_order_at,
+        last_order_at,
+        event_count,
+        view_count,
+        cart_count,
+        sessions_started
+    from daily
+    where user_id in (select user_id from universe)
+
+    union all
+
+    select
+        user_id,
+        snapshot_date - interval '1 microsecond' as ts,
+        true as is_snapshot,
+        0, null, null, 0, 0, 0, 0
+    from universe
+),
+
+as_of as (
+    select
+        user_id,
+        ts + interval '1 microsecond' as snapshot_date,
+        is_snapshot,
+        sum(order_count) over running as frequency_all_time,
+        min(first_order_at) over running as first_order_date,
+        max(last_order_at) over running as last_order_date,
+        sum(order_count) over last_60d as frequency_60d,
+        sum(order_count) over last_30d as frequency_30d,
+        sum(event_count) over running as total_events,
+        sum(view_count) over running as view_count,
+        sum(cart_count) over running as cart_count,
+        sum(sessions_started) over running as session_count,
+        sum(order_count) over next_30d as future_orders
+    from timeline
+    window
+        running as (partition by user_id order by ts rows between unbounded preceding and current row),
+        last_60d as (partition by user_id order by ts range between interval '60 days' preceding and current row),
+        last_30d as (partition by user_id order by ts range between interval '30 days' preceding and current row),
+        next_30d as (partition by user_id order by ts range between current row and interval '30 days' following)
+)
+
+select
+    a.snapshot_date,
+    a.user_id,
+
+    -- Demographics
+    u.traffic_source,
+    u.country,
+    u.gender,
+
+    -- RFM Features
+    a.frequency_all_time,
+    a.frequency_60d,
+    a.frequency_30d,
+    (EXTRACT(EPOCH FROM (a.snapshot_date - a.last_order_date)) / 86400)::int as recency_days,
+    (EXTRACT(EPOCH FROM (a.snapshot_date - a.first_order_date)) / 86400)::int as tenure_days,
+
+    -- Engagement Features
+    a.total_events,
+    a.view_count,
+    a.cart_count,
+    a.session_count,
+
+    -- Ratios
+    case when a.view_count > 0
+         then a.cart_count::float / a.view_count
+         else 0
+    end as view_to_cart_rate,
+
+    -- Target: no purchase in the 30 days after the snapshot = churned
+    case
+        when a.future_orders = 0 then 1
+        else 0
+    end as is_churned
+
+from as_of a
+join {{ ref('stg_users') }} u on a.user_id = u.user_id
+where a.is_snapshot
@@ -0,0 +1,92 @@
+"""Benchmark: native categorical encoding vs the legacy one-hot path.
+
+Measures, on the cached training snapshot, for both encodings:
+  * model-matrix width and memory (deep),
+  * encoding time for the full frame,
+  * XGBoost training time (train_advanced.py parameters),
+  * single-row serving latency (encode one row + predict), p50/p95,
+and writes the comparison to reports/categorical_benchmark.json.
+
+Usage:
+    python ml/benchmarks/categorical_vs_onehot.py [--rows 500]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import xgboost as xgb
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from ml.snapshot_cache import load_training_set
+from ml.feature_spec import TARGET, build_spec, encode, encode_one_hot
+from ml.training.train_advanced import XGB_PARAMS, engine
+
+REPORT_PATH = "reports/categorical_benchmark.json"
+
+
+def _timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def benchmark_path(name, df, y, encode_fn, params, latency_rows):
+    X, encode_s = _timed(encode_fn, df)
+    model = xgb.XGBClassifier(**params)
+    _, train_s = _timed(model.fit, X, y)
+    booster = model.get_booster()
+
+    latencies = []
+    for i in range(min(latency_rows, len(df))):
+        row = df.iloc[[i]]
+        start = time.perf_counter()
+        x_row = encode_fn(row)
+        booster.predict(xgb.DMatrix(x_row, enable_categorical=True))
+        latencies.append(time.perf_counter() - start)
+    latencies_ms = np.array(latencies) * 1000
+
+    result = {
+        "path": name,
+        "columns": X.shape[1],
+        "memory_mb": X.memory_usage(deep=True).sum() / 1e6,
+        "encode_s": encode_s,
+        "train_s": train_s,
+        "row_latency_p50_ms": float(np.percentile(latencies_ms, 50)),
+        "row_latency_p95_ms": float(np.percentile(latencies_ms, 95)),
+    }
+    print(f"{name:12s} cols={result['columns']:4d} mem={result['memory_mb']:8.2f}MB "
+          f"encode={encode_s:6.3f}s train={train_s:7.2f}s "
+          f"p50={result['row_latency_p50_ms']:.2f}ms p95={result['row_latency_p95_ms']:.2f}ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=500, help="rows used for the serving latency loop")
+    args = parser.parse_args()
+
+    df = load_training_set(engine)
+    y = df[TARGET]
+    spec = build_spec(df)
+    print(f"Training rows: {len(df)}")
+
+    # One-hot columns are derived from the full frame once, then enforced per row (as serving did).
+    onehot_columns = list(encode_one_hot(df).columns)
+    onehot_params = {k: v for k, v in XGB_PARAMS.items() if k != "enable_categorical"}
+
+    results = [
+        benchmark_path("one_hot", df, y, lambda d: encode_one_hot(d, onehot_columns), onehot_params, args.rows),
+        benchmark_path("categorical", df, y, lambda d: encode(d, spec), XGB_PARAMS, args.rows),
+    ]
+
+    os.makedirs(os.path.dirname(REPORT_PATH), exist_ok=True)
+    with open(REPORT_PATH, "w") as f:
+        json.dump({"rows": len(df), "results": results}, f, indent=2)
+    print(f"Benchmark saved to {REPORT_PATH}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Benchmark: API cold start in the MLflow and slim serving modes.
+
+Each trial starts a fresh interpreter (as a new replica would) and measures:
+  * total time from process spawn to a loaded model,
+  * import time of ``ml.inference.app`` and model startup time,
+  * which heavy modules ended up imported (read from ``sys.modules``, so pandas
+    shows up in both modes - xgboost 1.7.6 imports it when it is installed),
+  * in-process single-row scoring latency (encode + predict), p50/p95,
+and writes the comparison to reports/serving_cold_start.json.
+
+The slim mode needs a bundle first: ``python ml/inference/export_bundle.py``.
+
+Usage:
+    python ml/benchmarks/serving_cold_start.py [--trials 5] [--modes mlflow slim]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+REPORT_PATH = "reports/serving_cold_start.json"
+HEAVY_MODULES = ["mlflow", "pandas", "sqlalchemy", "xgboost", "sklearn"]
+
+# Runs inside the child interpreter
+TRIAL_CODE = """
+import json, sys, time
+t0 = time.perf_counter()
+import ml.inference.app as app
+t1 = time.perf_counter()
+app.load_model()
+t2 = time.perf_counter()
+latencies = []
+if app.model is not None and app.feature_spec is not None:
+    row = {c: 0.0 for c in app.feature_spec["numeric"]}
+    row.update({c: (v[0] if v else None) for c, v in app.feature_spec["categorical"].items()})
+    for _ in range(%(requests)d):
+        s = time.perf_counter()
+        app.score_row(row)
+        latencies.append(time.perf_counter() - s)
+print("TRIAL " + json.dumps({
+    "import_s": t1 - t0,
+    "startup_s": t2 - t1,
+    "model_loaded": app.model is not None,
+    "heavy_modules": [m for m in %(heavy)r if m in sys.modules],
+    "modules_loaded": len(sys.modules),
+    "latencies": latencies,
+}))
+"""
+
+
+def run_trial(mode, requests):
+    env = dict(os.environ, SERVING_MODE=mode)
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", TRIAL_CODE % {"requests": requests, "heavy": HEAVY_MODULES}],
+                         cwd=REPO_ROOT, env=env, capture_output=True, text=True, check=True).stdout
+    total = time.perf_counter() - start
+    trial = json.loads(next(line for line in out.splitlines() if line.startswith("TRIAL "))[6:])
+    trial["process_total_s"] = total
+    return trial
+
+
+def benchmark_mode(mode, trials, requests):
+    runs = [run_trial(mode, requests) for _ in range(trials)]
+    latencies_ms = np.array([l for r in runs for l in r["latencies"]]) * 1000
+    result = {
+        "mode": mode,
+        "model_loaded": all(r["model_loaded"] for r in runs),
+        "process_total_s_median": float(np.median([r["process_total_s"] for r in runs])),
+        "import_s_median": float(np.median([r["import_s"] for r in runs])),
+        "startup_s_median": float(np.median([r["startup_s"] for r in runs])),
+        "heavy_modules": runs[-1]["heavy_modules"],
+        "modules_loaded": runs[-1]["modules_loaded"],
+        "row_latency_p50_ms": float(np.percentile(latencies_ms, 50)) if latencies_ms.size else None,
+        "row_latency_p95_ms": float(np.percentile(latencies_ms, 95)) if latencies_ms.size else None,
+    }
+    print(f"{mode:7s} total={result['process_total_s_median']:.3f}s import={result['import_s_median']:.3f}s "
+          f"startup={result['startup_s_median']:.3f}s modules={result['modules_loaded']} "
+          f"heavy={','.join(result['heavy_modules'])} p50={result['row_latency_p50_ms']}ms")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trials", type=int, default=5)
+    parser.add_argument("--requests", type=int, default=200, help="scoring calls per trial for the latency figures")
+    parser.add_argument("--modes", nargs="+", default=["mlflow", "slim"], choices=["mlflow", "slim"])
+    args = parser.parse_args()
+
+    results = [benchmark_mode(mode, args.trials, args.requests) for mode in args.modes]
+    os.makedirs(os.path.dirname(REPORT_PATH), exist_ok=True)
+    with open(REPORT_PATH, "w") as f:
+        json.dump({"trials": args.trials, "results": results}, f, indent=2)
+    print(f"Saved {REPORT_PATH}")
+
+
+if __name__ == "__main__":
+    main()
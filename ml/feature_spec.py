@@ -0,0 +1,128 @@
+"""Churn model feature specification shared by training, batch scoring and serving.
+
+Categorical features are encoded as pandas categoricals over a *frozen*
+vocabulary captured at training time (XGBoost ``enable_categorical``), instead
+of one-hot columns. The vocabulary is logged next to the model as
+``feature_spec.json`` so every consumer encodes rows identically; values that
+were not seen in training become missing (NaN) and follow XGBoost's default
+branch. Numeric features are downcast to float32 - the precision XGBoost uses
+internally anyway.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+NUMERIC_FEATURES = ['recency_days', 'frequency_60d', 'frequency_30d', 'tenure_days',
+                    'total_events', 'view_count', 'cart_count', 'session_count', 'view_to_cart_rate', 'frequency_all_time']
+CATEGORICAL_FEATURES = ['traffic_source', 'country', 'gender']
+TARGET = 'is_churned'
+
+SPEC_FILE = "feature_spec.json"
+SPEC_VERSION = 1
+
+
+def build_spec(df):
+    """Freeze the category vocabulary from the training frame."""
+    categorical = {}
+    for col in CATEGORICAL_FEATURES:
+        values = df[col].dropna().astype(str).unique()
+        categorical[col] = sorted(values.tolist())
+    return {
+        "version": SPEC_VERSION,
+        "numeric": list(NUMERIC_FEATURES),
+        "categorical": categorical,
+    }
+
+
+def feature_names(spec):
+    return spec["numeric"] + list(spec["categorical"])
+
+
+def encode(df, spec):
+    """Return the model matrix: float32 numerics + fixed-vocabulary categoricals."""
+    data = {}
+    for col in spec["numeric"]:
+        data[col] = pd.to_numeric(df[col], errors="coerce").astype(np.float32)
+    for col, vocab in spec["categorical"].items():
+        data[col] = pd.Categorical(df[col].astype(object), categories=vocab)
+    return pd.DataFrame(data, index=df.index)
+
+
+def encode_one_hot(df, model_features=None):
+    """Legacy one-hot path (models trained before the feature spec existed)."""
+    df_encoded = pd.get_dummies(df[NUMERIC_FEATURES + CATEGORICAL_FEATURES],
+                                columns=CATEGORICAL_FEATURES,
+                                drop_first=True)
+    if model_features is None:
+        return df_encoded
+    for feat in model_features:
+        if feat not in df_encoded.columns:
+            df_encoded[feat] = 0
+    return df_encoded[model_features]
+
+
+def save_spec(spec, directory):
+    with open(os.path.join(directory, SPEC_FILE), "w") as f:
+        json.dump(spec, f, indent=2)
+
+
+def load_spec(directory):
+    path = os.path.join(directory, SPEC_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def download_model(model_uri):
+    import mlflow.artifacts
+
+    return mlflow.artifacts.download_artifacts(artifact_uri=model_uri)
+
+
+def load_model_dir(local_dir):
+    """Load (booster, spec or None) from a downloaded MLflow xgboost model directory."""
+    import mlflow.xgboost
+
+    model = mlflow.xgboost.load_model(local_dir)
+    booster = model.get_booster() if hasattr(model, "get_booster") else model
+    return booster, load_spec(local_dir)
+
+
+def load_model_bundle(model_uri):
+    """Download a registered model and return (booster, spec or None)."""
+    return load_model_dir(download_model(model_uri))
+
+
+def prepare(df, booster, spec):
+    """Encode ``df`` for ``booster`` using its spec, or the legacy one-hot layout."""
+    if spec is not None:
+        return encode(df, spec)
+    return encode_one_hot(df, booster.feature_names)
+
+
+def predict_proba(booster, X):
+    import xgboost as xgb
+
+    return booster.predict(xgb.DMatrix(X, enable_categorical=True))
+
+
+class FrameModel:
+    """Booster + spec behind the same encode/predict interface as ``SlimModel``, via pandas."""
+
+    def __init__(self, booster, spec):
+        self.booster = booster
+        self.spec = spec
+        # Models with equal keys accept the same encoded frame
+        self.encoding_key = json.dumps(spec if spec is not None else booster.feature_names, sort_keys=True)
+
+    def encode(self, rows):
+        return prepare(pd.DataFrame(list(rows)), self.booster, self.spec)
+
+    def concat(self, parts):
+        return pd.concat(parts, ignore_index=True)
+
+    def predict(self, X):
+        return predict_proba(self.booster, X)
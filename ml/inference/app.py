@@ -1,10 +1,20 @@
-from fastapi import FastAPI, HTTPException
+import time
+
+_import_started = time.perf_counter()
+
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-import mlflow.xgboost
-import pandas as pd
 from sqlalchemy import create_engine, text
+from sqlalchemy.exc import ProgrammingError
+from datetime import date
+from typing import List, Optional
 import os
-import numpy as np
+
+from ml.inference.online_features import fetch_fresh_features, online_tables_exist
+from ml.inference.routing import assign, parse_variants
+from ml.inference import score_export
+from ml.monitoring.sketches import DriftMonitor, load_reference
 
 # Database Connection
 db_user = os.getenv('POSTGRES_USER', 'user')
@@ -16,10 +26,38 @@ db_name = os.getenv('POSTGRES_DB', 'ecom')
 connection_str = f"postgresql+psycopg2://{db_user}:{db_pass}@{db_host}:{db_port}/{db_name}"
 engine = create_engine(connection_str)
 
-# MLflow Config
-mlflow.set_tracking_uri(os.getenv("MLFLOW_TRACKING_URI", "http://mlflow:5001"))
+# Serving mode: "mlflow" resolves the latest registered version through the MLflow client;
+# "slim" loads a bundle exported by ml/inference/export_bundle.py (native booster + feature
+# spec) without importing mlflow (pandas still comes in through xgboost).
+SERVING_MODE = os.getenv("SERVING_MODE", "mlflow")
+SERVING_BUNDLE_DIR = os.getenv("SERVING_BUNDLE_DIR", "models/serving/churn_prediction_advanced")
 model_name = "churn_prediction_advanced"
 model = None
+feature_spec = None
+drift_monitor = None
+
+# Traffic split: "name=source:weight,..." where source is a registered version ("latest" or a
+# number, optionally prefixed with another registered model, e.g. churn_prediction_compact/latest)
+# in mlflow mode, or a bundle directory in slim mode. Users stick to a variant by
+# hashing user_id with EXPERIMENT_SALT. SHADOW_VARIANT ("name=source") scores every request
+# off the response path and batches results into analytics.shadow_scores.
+SERVING_VARIANTS = os.getenv("SERVING_VARIANTS") or (
+    f"control={SERVING_BUNDLE_DIR if SERVING_MODE == 'slim' else 'latest'}:100")
+SHADOW_VARIANT = os.getenv("SHADOW_VARIANT")
+EXPERIMENT_SALT = os.getenv("EXPERIMENT_SALT", "churn_model_split")
+variants = {}  # name -> {"model", "version", "weight"}
+variant_weights = []
+shadow_scorer = None
+DRIFT_WINDOW_SECONDS = int(os.getenv("DRIFT_WINDOW_MINUTES", "60")) * 60
+# Fresh features: batch rollup + streamed activity (pipelines/streaming/ingest_stream.py)
+# instead of the churn_scoring snapshot. Opt-in; the ingester owns the online schema, and
+# requests fall back to churn_scoring while its tables don't exist.
+ONLINE_FEATURES = os.getenv("ONLINE_FEATURES", "0") == "1"
+online_features_ready = False
+
+# Cold-start timings, reported by /health
+serving_stats = {"serving_mode": SERVING_MODE, "online_features": ONLINE_FEATURES, "model_version": None,
+                 "startup_seconds": None}
 
 # App Definition
 app = FastAPI(title="Churn Prediction API", version="1.0")
@@ -32,98 +70,196 @@ class PredictionResponse(BaseModel):
     churn_probability: float
     is_high_risk: bool
     recommended_action: str
+    model_variant: str
+    model_version: str
 
-@app.on_event("startup")
-def load_model():
-    global model
-    try:
-        print(f"Loading Model: {model_name}...")
+def load_registered_model(version="latest"):
+    import mlflow
+    from ml.feature_spec import FrameModel, download_model, load_model_dir
+
+    mlflow.set_tracking_uri(os.getenv("MLFLOW_TRACKING_URI", "http://mlflow:5001"))
+    registered, _, version = version.rpartition("/")
+    registered = registered or model_name
+    if version == "latest":
         # In production, use "models:/{model_name}/Production". Here we use "latest" or specific run.
         # Since we just registered it, let's grab the latest version.
         client = mlflow.MlflowClient()
-        latest_version = client.get_latest_versions(model_name, stages=["None"])[0].version
-        model_uri = f"models:/{model_name}/{latest_version}"
-        model = mlflow.xgboost.load_model(model_uri)
+        version = client.get_latest_versions(registered, stages=["None"])[0].version
+    model_uri = f"models:/{registered}/{version}"
+    local_dir = download_model(model_uri)
+    booster, spec = load_model_dir(local_dir)
+    return FrameModel(booster, spec), load_reference(local_dir), version
+
+def load_slim_bundle(directory):
+    from ml.inference.slim_model import load_bundle
+
+    slim = load_bundle(directory)
+    return slim, load_reference(directory), slim.manifest["model_version"]
+
+def load_variant(source):
+    if SERVING_MODE == "slim":
+        return load_slim_bundle(source)
+    return load_registered_model(source)
+
+@app.on_event("startup")
+def load_model():
+    global model, feature_spec, drift_monitor, shadow_scorer, online_features_ready
+    started = time.perf_counter()
+    try:
+        print(f"Loading Model: {model_name} ({SERVING_MODE} mode)...")
+        reference = None
+        for i, (name, source, weight) in enumerate(parse_variants(SERVING_VARIANTS)):
+            loaded, variant_reference, version = load_variant(source)
+            variants[name] = {"model": loaded, "version": str(version), "weight": weight}
+            variant_weights.append((name, weight))
+            print(f"Variant {name}: version {version}, weight {weight}")
+            if i == 0:
+                # The first variant is the control: drift is tracked against its reference
+                model, feature_spec, reference = loaded, loaded.spec, variant_reference
+                serving_stats["model_version"] = str(version)
+        if SHADOW_VARIANT:
+            from ml.inference.shadow import ShadowScorer, shadow_table_exists
+
+            name, source, _ = parse_variants(SHADOW_VARIANT)[0]
+            if shadow_table_exists(engine):
+                loaded, _, version = load_variant(source)
+                shadow_scorer = ShadowScorer(name, loaded, version, engine)
+                print(f"Shadow variant {name}: version {version}")
+            else:
+                print("SHADOW_VARIANT set but analytics.shadow_scores is missing (run batch_score.py); shadow scoring off.")
+        if ONLINE_FEATURES:
+            online_features_ready = online_tables_exist(engine)
+            if not online_features_ready:
+                print("ONLINE_FEATURES=1 but the online schema is missing (run ingest_stream.py); using churn_scoring.")
+        if reference is not None:
+            drift_monitor = DriftMonitor(reference, window_seconds=DRIFT_WINDOW_SECONDS)
+        else:
+            print("No reference histograms logged with this model; /drift disabled.")
         print("Model Loaded Successfully.")
     except Exception as e:
         print(f"Error loading model: {e}")
+    serving_stats["startup_seconds"] = round(time.perf_counter() - started, 4)
+    print(f"Import {serving_stats['import_seconds']}s, startup {serving_stats['startup_seconds']}s")
+
+@app.on_event("shutdown")
+def flush_shadow():
+    if shadow_scorer is not None:
+        shadow_scorer.close()
 
 def get_user_features(user_id: int):
+    global online_features_ready
+    if ONLINE_FEATURES and online_features_ready:
+        try:
+            with engine.connect() as conn:
+                return fetch_fresh_features(conn, user_id)
+        except ProgrammingError as e:
+            # Online tables dropped under us: serve the batch snapshot instead of failing
+            print(f"Online features unavailable, falling back to churn_scoring: {e.orig}")
+            online_features_ready = False
+
     # Fetch features from the "Inference Feature Mart" (churn_scoring)
     query = text("SELECT * FROM public_marts.churn_scoring WHERE user_id = :user_id")
     with engine.connect() as conn:
         result = conn.execute(query, {"user_id": user_id}).fetchone()
-    
+
     if not result:
         return None
-        
-    # Convert to DataFrame to match training format
-    # Columns must verify against SQL schema
-    cols = result._mapping.keys()
-    vals = result._mapping.values()
-    df = pd.DataFrame([vals], columns=cols)
-    return df
-
-def align_features(df_inference):
-    # Same logic as batch_score.py (DRY violation but simple for now)
-    numeric_features = ['recency_days', 'frequency_60d', 'frequency_30d', 'tenure_days', 
-                       'total_events', 'view_count', 'cart_count', 'session_count', 'view_to_cart_rate', 'frequency_all_time']
-    categorical_features = ['traffic_source', 'country', 'gender']
-    
-    # Encode with pandas get_dummies
-    # Issue: Single row might miss categories. 
-    # Fix: We really should use a pre-fitted encoder pipeline.
-    # Hack for Project 2: Force dummy columns.
-    
-    if model is None:
-        raise ValueError("Model not loaded")
+    return dict(result._mapping)
 
-    df_encoded = pd.get_dummies(df_inference[numeric_features + categorical_features], 
-                                columns=categorical_features, 
-                                drop_first=True)
-    
-    # Align cols
-    booster = model.get_booster()
-    model_features = booster.feature_names
-    
-    for feat in model_features:
-        if feat not in df_encoded.columns:
-            df_encoded[feat] = 0
-            
-    return df_encoded[model_features]
+def score_row(row, scoring_model=None):
+    # Encoding is shared with batch_score.py via ml/feature_spec.py (mlflow mode) or done
+    # with NumPy by ml/inference/slim_model.py (slim mode); returns (probability, encoded row)
+    scoring_model = scoring_model or model
+    if scoring_model is None:
+        raise ValueError("Model not loaded")
+    X = scoring_model.encode([row])
+    return float(scoring_model.predict(X)[0]), X
 
 @app.post("/predict", response_model=PredictionResponse)
 def predict_churn(request: PredictionRequest):
     if model is None:
         raise HTTPException(status_code=503, detail="Model not initialized")
-        
-    df = get_user_features(request.user_id)
-    if df is None:
+
+    row = get_user_features(request.user_id)
+    if row is None:
         raise HTTPException(status_code=404, detail="User not found in scoring mart")
-        
-    # Preprocess
+
     try:
-        X = align_features(df)
-        
-        # Predict
-        prob = float(model.predict_proba(X)[:, 1][0])
-        
+        # Sticky variant assignment, then one feature fetch + encoding for every model
+        variant = assign(request.user_id, variant_weights, EXPERIMENT_SALT)
+        served = variants[variant]
+        prob, X = score_row(row, served["model"])
+
+        # Challenger scores the same row off the response path
+        if shadow_scorer is not None:
+            shared = X if shadow_scorer.model.encoding_key == served["model"].encoding_key else None
+            shadow_scorer.submit(request.user_id, row, shared, variant, served["version"], prob)
+
+        # Online drift sketches (O(1) per request)
+        if drift_monitor is not None:
+            drift_monitor.observe(row, prob)
+
         # Action Logic
         # Action Logic: >0.7 = High Risk
         action = "Retain" if prob < 0.5 else "Send Coupon"
         if prob > 0.8:
             action = "Call Customer"
-            
+
         return {
             "user_id": request.user_id,
             "churn_probability": prob,
             "is_high_risk": prob > 0.7,
-            "recommended_action": action
+            "recommended_action": action,
+            "model_variant": variant,
+            "model_version": served["version"]
         }
     except Exception as e:
         print(f"Prediction Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/drift")
+def drift():
+    # Rolling PSI / quantiles of served features and predictions vs the training reference
+    if drift_monitor is None:
+        raise HTTPException(status_code=503, detail="Drift monitor not initialized")
+    return drift_monitor.snapshot()
+
+@app.get("/export/scores")
+def export_scores(
+    action: Optional[List[str]] = Query(None),
+    min_probability: Optional[float] = None,
+    max_probability: Optional[float] = None,
+    traffic_source: Optional[List[str]] = Query(None),
+    scoring_date: Optional[date] = None,
+    format: str = "ndjson",
+    chunk_size: int = Query(score_export.DEFAULT_CHUNK_SIZE, ge=100, le=100000),
+    limit: Optional[int] = Query(None, ge=1),
+    user_id: Optional[int] = None,
+    history: bool = False,
+):
+    # Segment pulls of batch scores: server-side cursor + chunked body, constant memory per export
+    if format not in score_export.FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {sorted(score_export.FORMATS)}")
+    if format == "arrow":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise HTTPException(status_code=501, detail="Arrow export needs pyarrow installed; use format=ndjson")
+    sql, params = score_export.build_query(action, min_probability, max_probability, traffic_source,
+                                           scoring_date, limit, user_id, history)
+    chunks = score_export.stream_chunks(engine, sql, params, chunk_size)
+    body = score_export.arrow_stream(chunks) if format == "arrow" else score_export.ndjson_stream(chunks)
+    return StreamingResponse(body, media_type=score_export.FORMATS[format])
+
 @app.get("/health")
 def health_check():
-    return {"status": "healthy", "model_loaded": model is not None}
+    return {
+        "status": "healthy",
+        "model_loaded": model is not None,
+        **serving_stats,
+        "online_features_active": ONLINE_FEATURES and online_features_ready,
+        "variants": {name: {"version": v["version"], "weight": v["weight"]} for name, v in variants.items()},
+        "shadow": shadow_scorer.snapshot() if shadow_scorer is not None else None,
+    }
+
+serving_stats["import_seconds"] = round(time.perf_counter() - _import_started, 4)
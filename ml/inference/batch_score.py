@@ -1,9 +1,14 @@
 import pandas as pd
 import numpy as np
 import mlflow
-import mlflow.xgboost
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine
 import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from ml.feature_spec import load_model_bundle, prepare, predict_proba
+from ml.profiling import log_profile, stage
+from ml.inference.score_store import HISTORY_TABLE, LATEST_TABLE, SCORE_COLUMNS, drop_expired_partitions, ensure_score_tables, write_scores
 
 # Database Connection
 db_user = os.getenv('POSTGRES_USER', 'user')
@@ -15,6 +20,9 @@ db_name = os.getenv('POSTGRES_DB', 'ecom')
 connection_str = f"postgresql+psycopg2://{db_user}:{db_pass}@{db_host}:{db_port}/{db_name}"
 engine = create_engine(connection_str)
 
+# Days of score history kept behind the newest scoring date (dropped a monthly partition at a time)
+SCORE_HISTORY_RETENTION_DAYS = int(os.getenv("SCORE_HISTORY_RETENTION_DAYS", "365"))
+
 def get_inference_data():
     print("Loading Inference Data (Today's Active Users)...")
     query = "SELECT * FROM public_marts.churn_scoring"
@@ -22,54 +30,27 @@ def get_inference_data():
     print(f"Users to Score: {len(df)}")
     return df
 
-def align_features(df_inference):
-    # Features used in training (Must match train_advanced.py)
-    numeric_features = ['recency_days', 'frequency_60d', 'frequency_30d', 'tenure_days', 
-                       'total_events', 'view_count', 'cart_count', 'session_count', 'view_to_cart_rate', 'frequency_all_time']
-    categorical_features = ['traffic_source', 'country', 'gender']
-    
-    # Encode
-    df_encoded = pd.get_dummies(df_inference[numeric_features + categorical_features], 
-                                columns=categorical_features, 
-                                drop_first=True)
-    
-    # We must match the model's expected columns. 
-    # In a real system, we'd load the feature list from an artifact.
-    # Here, we'll ensure common dummy columns exist.
-    # (Simplified: relying on XGBoost to handle missing cols if we named them right, 
-    # but strictly we should add missing cols as 0).
-    
-    return df_encoded
-
 def batch_score():
     mlflow.set_tracking_uri(os.getenv("MLFLOW_TRACKING_URI", "http://mlflow:5001"))
     
     # Load Model (Latest Version of Advanced)
     model_name = "churn_prediction_advanced"
     print(f"Loading Model: {model_name}...")
-    model = mlflow.xgboost.load_model(f"models:/{model_name}/latest")
+    with stage("load_model"):
+        booster, spec = load_model_bundle(f"models:/{model_name}/latest")
     
     # Load Data
-    df = get_inference_data()
-    X = align_features(df)
-    
-    # Align Columns (XGBoost is picky about column order matches sometimes, or just names)
-    # We will try predicting. If it fails due to mismatch, we'd add missing cols here.
-    # For robust handling, we get booster feature names:
-    booster = model.get_booster()
-    model_features = booster.feature_names
+    with stage("load"):
+        df = get_inference_data()
     
-    # Add missing columns with 0
-    for feat in model_features:
-        if feat not in X.columns:
-            X[feat] = 0
-            
-    # Reorder to match model
-    X = X[model_features]
+    # Encode with the model's frozen feature spec (legacy one-hot models are aligned to booster.feature_names)
+    with stage("encode"):
+        X = prepare(df, booster, spec)
     
     # Predict
     print("Scoring Users...")
-    probs = model.predict_proba(X)[:, 1]
+    with stage("predict"):
+        probs = predict_proba(booster, X)
     df['churn_probability'] = probs
     
     # --- Actionability Logic ---
@@ -91,21 +72,25 @@ def batch_score():
     df['recommended_action'] = np.select(conditions, choices, default='No Action')
     
     # Prepare Output
-    output = df[['user_id', 'scoring_date', 'churn_probability', 'expected_uplift_value', 'recommended_action', 'traffic_source']]
+    df['scoring_date'] = pd.to_datetime(df['scoring_date']).dt.date
+    output = df[SCORE_COLUMNS]
     
-    # Write to DB
-    print("Writing to analytics.churn_scores...")
-    with engine.connect() as conn:
-        conn.execute(text("CREATE SCHEMA IF NOT EXISTS analytics"))
-        conn.commit()
-        
-    output.to_sql('churn_scores', engine, schema='analytics', if_exists='replace', index=False)
+    # Write to DB: append to the partitioned history, upsert the latest score per user
+    print(f"Writing to {HISTORY_TABLE} and {LATEST_TABLE}...")
+    records = output.astype(object).where(output.notna(), None).to_dict("records")
+    with stage("write"), engine.begin() as conn:
+        ensure_score_tables(conn)
+        dates = write_scores(conn, records)
+        dropped = drop_expired_partitions(conn, SCORE_HISTORY_RETENTION_DAYS, max(dates))
+    print(f"Scores for {', '.join(map(str, dates))} stored; dropped expired partitions: {dropped or 'none'}")
     
     # Create Retention Targets View (Top 100)
-    top_targets = output[output['recommended_action'] != 'No Action'].sort_values('expected_uplift_value', ascending=False).head(500)
-    top_targets.to_sql('retention_targets', engine, schema='analytics', if_exists='replace', index=False)
+    with stage("targets"):
+        top_targets = output[output['recommended_action'] != 'No Action'].sort_values('expected_uplift_value', ascending=False).head(500)
+        top_targets.to_sql('retention_targets', engine, schema='analytics', if_exists='replace', index=False)
     
     print(f"Success! Scored {len(df)} users. Top 500 targets saved.")
+    log_profile(run_name="Batch_Scoring_Profile")
 
 if __name__ == "__main__":
     batch_score()
@@ -0,0 +1,71 @@
+"""Export a registered churn model as a slim serving bundle.
+
+Resolves the model through MLflow once, here, so serving replicas don't have to:
+the booster is re-saved in XGBoost's native UBJSON format next to its
+feature spec and reference histograms, plus a ``bundle.json`` manifest.
+Point the API at the directory with ``SERVING_MODE=slim SERVING_BUNDLE_DIR=...``.
+
+Usage:
+    python ml/inference/export_bundle.py [--model churn_prediction_advanced] [--version 3] [--out models/serving/churn_prediction_advanced]
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import datetime, timezone
+
+import mlflow
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from ml.feature_spec import SPEC_FILE, download_model, feature_names, load_model_dir, save_spec
+from ml.inference.slim_model import BUNDLE_FILE
+from ml.monitoring.sketches import load_reference, save_reference
+
+MODEL_FILE = "model.ubj"
+
+
+def export_bundle(model_name, version, out_dir):
+    mlflow.set_tracking_uri(os.getenv("MLFLOW_TRACKING_URI", "http://mlflow:5001"))
+    if version is None:
+        client = mlflow.MlflowClient()
+        version = max(int(v.version) for v in client.search_model_versions(f"name='{model_name}'"))
+    model_uri = f"models:/{model_name}/{version}"
+    print(f"Exporting {model_uri} to {out_dir}...")
+
+    local_dir = download_model(model_uri)
+    booster, spec = load_model_dir(local_dir)
+    if spec is None:
+        raise ValueError(f"{model_uri} was logged without {SPEC_FILE}; slim serving needs the categorical spec. Retrain with train_advanced.py.")
+
+    os.makedirs(out_dir, exist_ok=True)
+    booster.save_model(os.path.join(out_dir, MODEL_FILE))
+    save_spec(spec, out_dir)
+    reference = load_reference(local_dir)
+    if reference is not None:
+        save_reference(reference, out_dir)
+
+    manifest = {
+        "model_name": model_name,
+        "model_version": str(version),
+        "model_file": MODEL_FILE,
+        "spec_file": SPEC_FILE,
+        "feature_names": feature_names(spec),
+        "exported_at": datetime.now(timezone.utc).isoformat(),
+    }
+    with open(os.path.join(out_dir, BUNDLE_FILE), "w") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Bundle written: {', '.join(sorted(os.listdir(out_dir)))}")
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a registered model as a slim serving bundle")
+    parser.add_argument("--model", default="churn_prediction_advanced")
+    parser.add_argument("--version", type=int, default=None, help="registered version (default: latest)")
+    parser.add_argument("--out", default=None, help="output directory (default: models/serving/<model>)")
+    args = parser.parse_args()
+    export_bundle(args.model, args.version, args.out or os.path.join("models", "serving", args.model))
+
+
+if __name__ == "__main__":
+    main()
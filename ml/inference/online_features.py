@@ -0,0 +1,174 @@
+"""Online feature layer: streamed activity on top of the batch daily rollup.
+
+``pipelines/streaming/ingest_stream.py`` writes records newer than the batch
+cutoff into the ``online`` schema:
+  * online.orders          - one row per order (status upserts), counted at read time,
+  * online.sessions        - first-seen time per session, so a session counts once,
+  * online.user_event_days - additive per (user, day) event/session counters,
+  * online.stream_state    - per-source file offset and stream clock.
+
+The batch cutoff is the last ``activity_date`` in ``int_user_daily_activity``:
+the rollup owns every day up to it, the online tables only days after it, so the
+two are summed without double counting. Once dbt catches up, ``compact`` drops
+the online rows the rollup now covers.
+
+``FRESH_FEATURES_QUERY`` rebuilds the ``churn_scoring`` columns for one user as
+of the later of the mart's scoring date and the stream clock, reading the
+rollup through its (user_id, activity_date) index plus the user's online rows.
+"""
+from sqlalchemy import text
+
+ONLINE_DDL = [
+    "CREATE SCHEMA IF NOT EXISTS online",
+    """
+    CREATE TABLE IF NOT EXISTS online.orders (
+        order_id bigint PRIMARY KEY,
+        user_id bigint NOT NULL,
+        status text,
+        created_at timestamp NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS online_orders_user_idx ON online.orders (user_id)",
+    """
+    CREATE TABLE IF NOT EXISTS online.sessions (
+        session_id text PRIMARY KEY,
+        user_id bigint NOT NULL,
+        started_at timestamp NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS online.user_event_days (
+        user_id bigint NOT NULL,
+        activity_date date NOT NULL,
+        event_count bigint NOT NULL DEFAULT 0,
+        view_count bigint NOT NULL DEFAULT 0,
+        cart_count bigint NOT NULL DEFAULT 0,
+        purchase_event_count bigint NOT NULL DEFAULT 0,
+        sessions_started bigint NOT NULL DEFAULT 0,
+        updated_at timestamptz NOT NULL DEFAULT now(),
+        PRIMARY KEY (user_id, activity_date)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS online.stream_state (
+        source text PRIMARY KEY,
+        file_offset bigint,
+        stream_clock timestamp,
+        updated_at timestamptz NOT NULL DEFAULT now()
+    )
+    """,
+]
+
+ONLINE_TABLES = ["online.orders", "online.sessions", "online.user_event_days", "online.stream_state"]
+
+BATCH_CUTOFF_QUERY = "SELECT max(activity_date) FROM public_intermediate.int_user_daily_activity"
+
+FRESH_FEATURES_QUERY = """
+    WITH clock AS (
+        SELECT greatest(
+            (SELECT max(scoring_date) FROM public_marts.churn_scoring),
+            (SELECT max(stream_clock) FROM online.stream_state)
+        ) AS as_of
+    ),
+    batch AS (
+        SELECT
+            sum(a.order_count) AS orders_all,
+            sum(a.order_count) FILTER (WHERE a.activity_date >= (c.as_of - interval '60 days')::date) AS orders_60d,
+            sum(a.order_count) FILTER (WHERE a.activity_date >= (c.as_of - interval '30 days')::date) AS orders_30d,
+            max(a.last_order_at) AS last_order_at,
+            min(a.first_order_at) AS first_order_at,
+            sum(a.event_count) AS event_count,
+            sum(a.view_count) AS view_count,
+            sum(a.cart_count) AS cart_count,
+            sum(a.sessions_started) AS sessions_started
+        FROM public_intermediate.int_user_daily_activity a
+        CROSS JOIN clock c
+        WHERE a.user_id = :user_id AND a.activity_date < c.as_of::date
+    ),
+    stream_orders AS (
+        SELECT
+            count(*) FILTER (WHERE o.status NOT IN ('Returned', 'Cancelled')) AS orders_all,
+            count(*) FILTER (WHERE o.status NOT IN ('Returned', 'Cancelled')
+                             AND o.created_at >= (c.as_of - interval '60 days')::date) AS orders_60d,
+            count(*) FILTER (WHERE o.status NOT IN ('Returned', 'Cancelled')
+                             AND o.created_at >= (c.as_of - interval '30 days')::date) AS orders_30d,
+            max(o.created_at) FILTER (WHERE o.status NOT IN ('Returned', 'Cancelled')) AS last_order_at,
+            min(o.created_at) FILTER (WHERE o.status NOT IN ('Returned', 'Cancelled')) AS first_order_at
+        FROM online.orders o
+        CROSS JOIN clock c
+        WHERE o.user_id = :user_id AND o.created_at <= c.as_of
+    ),
+    stream_events AS (
+        SELECT
+            sum(event_count) AS event_count,
+            sum(view_count) AS view_count,
+            sum(cart_count) AS cart_count,
+            sum(sessions_started) AS sessions_started
+        FROM online.user_event_days
+        CROSS JOIN clock c
+        WHERE user_id = :user_id AND activity_date <= c.as_of::date
+    ),
+    combined AS (
+        SELECT
+            coalesce(b.orders_all, 0) + coalesce(o.orders_all, 0) AS frequency_all_time,
+            coalesce(b.orders_60d, 0) + coalesce(o.orders_60d, 0) AS frequency_60d,
+            coalesce(b.orders_30d, 0) + coalesce(o.orders_30d, 0) AS frequency_30d,
+            greatest(b.last_order_at, o.last_order_at) AS last_order_at,
+            least(b.first_order_at, o.first_order_at) AS first_order_at,
+            coalesce(b.event_count, 0) + coalesce(e.event_count, 0) AS total_events,
+            coalesce(b.view_count, 0) + coalesce(e.view_count, 0) AS view_count,
+            coalesce(b.cart_count, 0) + coalesce(e.cart_count, 0) AS cart_count,
+            coalesce(b.sessions_started, 0) + coalesce(e.sessions_started, 0) AS session_count
+        FROM batch b, stream_orders o, stream_events e
+    )
+    SELECT
+        u.user_id,
+        c.as_of AS scoring_date,
+        u.traffic_source,
+        u.country,
+        u.gender,
+        f.frequency_all_time,
+        f.frequency_60d,
+        f.frequency_30d,
+        (EXTRACT(EPOCH FROM (c.as_of - f.last_order_at)) / 86400)::int AS recency_days,
+        (EXTRACT(EPOCH FROM (c.as_of - f.first_order_at)) / 86400)::int AS tenure_days,
+        f.total_events,
+        f.view_count,
+        f.cart_count,
+        f.session_count,
+        CASE WHEN f.view_count > 0 THEN f.cart_count::float / f.view_count ELSE 0 END AS view_to_cart_rate
+    FROM public_staging.stg_users u
+    CROSS JOIN clock c
+    CROSS JOIN combined f
+    WHERE u.user_id = :user_id
+      AND f.frequency_all_time > 0 -- Only score existing customers, as churn_scoring does
+"""
+
+
+def ensure_online_tables(engine):
+    with engine.begin() as conn:
+        for statement in ONLINE_DDL:
+            conn.execute(text(statement))
+
+
+def online_tables_exist(engine):
+    with engine.connect() as conn:
+        return all(conn.execute(text("SELECT to_regclass(:table) IS NOT NULL"), {"table": table}).scalar()
+                   for table in ONLINE_TABLES)
+
+
+def batch_cutoff(conn):
+    """Last day owned by the batch rollup (None before the first dbt run)."""
+    return conn.execute(text(BATCH_CUTOFF_QUERY)).scalar()
+
+
+def compact(conn, cutoff):
+    """Drop online rows for days the batch rollup now covers."""
+    conn.execute(text("DELETE FROM online.orders WHERE created_at < CAST(:cutoff AS date) + 1"), {"cutoff": cutoff})
+    conn.execute(text("DELETE FROM online.sessions WHERE started_at < CAST(:cutoff AS date) + 1"), {"cutoff": cutoff})
+    conn.execute(text("DELETE FROM online.user_event_days WHERE activity_date <= :cutoff"), {"cutoff": cutoff})
+
+
+def fetch_fresh_features(conn, user_id):
+    row = conn.execute(text(FRESH_FEATURES_QUERY), {"user_id": user_id}).fetchone()
+    return dict(row._mapping) if row else None
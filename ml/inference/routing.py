@@ -0,0 +1,47 @@
+"""Sticky traffic splitting between model variants.
+
+A unit (user_id) is hashed with an experiment salt into one of ``BUCKETS``
+buckets, so the same user always lands on the same variant for a given salt
+and weights, across requests, replicas and restarts. Changing the salt
+reshuffles everyone - use a new salt per experiment.
+
+Variants are configured as ``name=source:weight`` pairs, e.g.
+``control=latest:90,treatment=4:10`` (MLflow versions, optionally ``model_name/version``) or
+``control=models/serving/v3:50,treatment=models/serving/v4:50`` (slim bundles).
+"""
+import hashlib
+
+BUCKETS = 10000
+
+
+def parse_variants(config):
+    """Parse ``name=source[:weight],...`` into [(name, source, weight)]; weight defaults to 100."""
+    variants = []
+    for item in filter(None, (part.strip() for part in config.split(","))):
+        name, _, rest = item.partition("=")
+        if not rest:
+            raise ValueError(f"Variant '{item}' must look like name=source[:weight]")
+        source, _, weight = rest.rpartition(":")
+        if not source or not weight.isdigit():
+            source, weight = rest, "100"
+        variants.append((name.strip(), source.strip(), int(weight)))
+    if not variants or sum(w for _, _, w in variants) <= 0:
+        raise ValueError(f"No variants with positive weight in '{config}'")
+    return variants
+
+
+def bucket(unit_id, salt, buckets=BUCKETS):
+    digest = hashlib.sha256(f"{salt}:{unit_id}".encode()).digest()
+    return int.from_bytes(digest[:8], "big") % buckets
+
+
+def assign(unit_id, weights, salt):
+    """Pick a variant name for ``unit_id`` from ``[(name, weight)]`` by cumulative weight."""
+    total = sum(w for _, w in weights)
+    point = bucket(unit_id, salt) * total / BUCKETS
+    cumulative = 0
+    for name, weight in weights:
+        cumulative += weight
+        if point < cumulative:
+            return name
+    return weights[-1][0]
@@ -0,0 +1,115 @@
+"""Streaming export of batch churn scores for segment pulls.
+
+``/export/scores`` filters the newest run's scores (``analytics.churn_scores``)
+or, with ``history``, every stored run (``analytics.churn_score_history``) by
+recommended action, probability range, traffic source, scoring date and user,
+and streams the matches as NDJSON or Arrow IPC (stream format). Rows are read through a server-side cursor
+(``stream_results``) in ``chunk_size`` partitions and each partition is sent as
+soon as it is encoded, so server memory stays at one chunk no matter how many
+rows match. pyarrow is only imported for Arrow requests.
+"""
+import json
+
+from sqlalchemy import text
+
+from ml.inference.score_store import HISTORY_TABLE, LATEST_TABLE, SCORE_COLUMNS
+
+EXPORT_COLUMNS = SCORE_COLUMNS
+FORMATS = {"ndjson": "application/x-ndjson", "arrow": "application/vnd.apache.arrow.stream"}
+DEFAULT_CHUNK_SIZE = 10000
+# pyarrow type factory per export column, mirroring the score_store DDL
+ARROW_TYPES = {"user_id": "int64", "scoring_date": "date32", "churn_probability": "float64",
+               "expected_uplift_value": "float64", "recommended_action": "string", "traffic_source": "string"}
+
+
+def build_query(actions=None, min_probability=None, max_probability=None, traffic_sources=None,
+                scoring_date=None, limit=None, user_id=None, history=False):
+    """Return (SQL, params) for the filtered export; every filter is optional."""
+    clauses, params = [], {}
+    if user_id is not None:
+        clauses.append("user_id = :user_id")
+        params["user_id"] = user_id
+    if actions:
+        clauses.append("recommended_action = ANY(:actions)")
+        params["actions"] = list(actions)
+    if min_probability is not None:
+        clauses.append("churn_probability >= :min_probability")
+        params["min_probability"] = min_probability
+    if max_probability is not None:
+        clauses.append("churn_probability <= :max_probability")
+        params["max_probability"] = max_probability
+    if traffic_sources:
+        clauses.append("traffic_source = ANY(:traffic_sources)")
+        params["traffic_sources"] = list(traffic_sources)
+    if scoring_date is not None:
+        # Compared on the bare partition key so history reads prune to one month
+        clauses.append("scoring_date = :scoring_date")
+        params["scoring_date"] = scoring_date
+    sql = f"SELECT {', '.join(EXPORT_COLUMNS)} FROM {HISTORY_TABLE if history else LATEST_TABLE}"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    if limit is not None:
+        sql += " LIMIT :limit"
+        params["limit"] = limit
+    return sql, params
+
+
+def stream_chunks(engine, sql, params, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield lists of row tuples from a server-side cursor, ``chunk_size`` rows at a time."""
+    with engine.connect() as conn:
+        result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(text(sql), params)
+        for rows in result.partitions(chunk_size):
+            yield rows
+
+
+def ndjson_stream(chunks):
+    for rows in chunks:
+        yield "".join(json.dumps(dict(zip(EXPORT_COLUMNS, row)), default=str) + "\n" for row in rows).encode()
+
+
+class _ChunkSink:
+    """File-like sink for the Arrow stream writer; ``drain`` hands back what was written since the last call."""
+
+    closed = False
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data, self.parts = b"".join(self.parts), []
+        return data
+
+
+def arrow_schema():
+    """Fixed export schema (matches the score_store DDL), so all-NULL chunks can't change column types."""
+    import pyarrow as pa
+
+    return pa.schema([(col, getattr(pa, ARROW_TYPES[col])()) for col in EXPORT_COLUMNS])
+
+
+def arrow_stream(chunks):
+    """Arrow IPC stream with a fixed schema; every chunk is one record batch."""
+    import pyarrow as pa
+
+    schema = arrow_schema()
+    sink = _ChunkSink()
+    writer = pa.ipc.new_stream(pa.PythonFile(sink, mode="w"), schema)
+    yield sink.drain()
+    for rows in chunks:
+        columns = list(zip(*rows))
+        batch = pa.record_batch([pa.array(col, type=field.type) for col, field in zip(columns, schema)],
+                                schema=schema)
+        writer.write_batch(batch)
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
@@ -0,0 +1,155 @@
+"""Churn score storage: append-only partitioned history plus a latest-score table.
+
+  * analytics.churn_score_history - every batch run's scores, range-partitioned by
+    ``scoring_date`` into monthly partitions (created on demand), primary key
+    (user_id, scoring_date). One user's history is an index probe per partition;
+    date filters prune to the matching months.
+  * analytics.churn_scores - the newest run's scores, one row per user (primary
+    key user_id), upserted from that run's history rows. Users the newest run
+    did not score are pruned in the same transaction, so the table keeps the
+    current scoring population the dashboards aggregate over, and latest reads
+    never touch the history.
+
+Re-scoring a date replaces that date's rows rather than duplicating them. Old
+months are dropped whole (``DROP TABLE`` on the partition, no bulk DELETE) once
+they fall ``retention_days`` behind the run's newest scoring date - measured on the
+data's own clock, not wall time, since the TheLook snapshot is historical.
+"""
+from datetime import date
+
+from sqlalchemy import text
+
+HISTORY_TABLE = "analytics.churn_score_history"
+LATEST_TABLE = "analytics.churn_scores"
+# Written by the API's shadow scorer, which only inserts; the table is created here with the score tables
+SHADOW_TABLE = "analytics.shadow_scores"
+SCORE_COLUMNS = ["user_id", "scoring_date", "churn_probability", "expected_uplift_value",
+                 "recommended_action", "traffic_source"]
+
+SCORE_DDL = [
+    "CREATE SCHEMA IF NOT EXISTS analytics",
+    f"""
+    CREATE TABLE IF NOT EXISTS {HISTORY_TABLE} (
+        user_id bigint NOT NULL,
+        scoring_date date NOT NULL,
+        churn_probability double precision,
+        expected_uplift_value double precision,
+        recommended_action text,
+        traffic_source text,
+        scored_at timestamptz NOT NULL DEFAULT now(),
+        PRIMARY KEY (user_id, scoring_date)
+    ) PARTITION BY RANGE (scoring_date)
+    """,
+    f"""
+    CREATE TABLE IF NOT EXISTS {LATEST_TABLE} (
+        user_id bigint PRIMARY KEY,
+        scoring_date date NOT NULL,
+        churn_probability double precision,
+        expected_uplift_value double precision,
+        recommended_action text,
+        traffic_source text,
+        scored_at timestamptz NOT NULL DEFAULT now()
+    )
+    """,
+    f"CREATE INDEX IF NOT EXISTS churn_scores_action_idx ON {LATEST_TABLE} (recommended_action, churn_probability)",
+    f"CREATE INDEX IF NOT EXISTS churn_scores_date_idx ON {LATEST_TABLE} (scoring_date)",
+    f"""
+    CREATE TABLE IF NOT EXISTS {SHADOW_TABLE} (
+        scored_at timestamptz NOT NULL,
+        user_id bigint NOT NULL,
+        served_variant text,
+        served_version text,
+        served_probability double precision,
+        shadow_variant text,
+        shadow_version text,
+        shadow_probability double precision
+    )
+    """,
+]
+
+
+def month_start(day):
+    return date(day.year, day.month, 1)
+
+
+def next_month(day):
+    return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+
+def partition_name(day):
+    return f"{HISTORY_TABLE}_p{day:%Y%m}"
+
+
+def ensure_score_tables(conn):
+    # Before the history existed churn_scores was rewritten by to_sql (no key); replace it once
+    legacy = conn.execute(text("""
+        SELECT to_regclass(:table) IS NOT NULL
+           AND NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conrelid = to_regclass(:table) AND contype = 'p')
+    """), {"table": LATEST_TABLE}).scalar()
+    if legacy:
+        print(f"Replacing legacy {LATEST_TABLE} (no primary key) with the latest-score table.")
+        conn.execute(text(f"DROP TABLE {LATEST_TABLE}"))
+    for statement in SCORE_DDL:
+        conn.execute(text(statement))
+
+
+def ensure_partition(conn, day):
+    start = month_start(day)
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {partition_name(start)} PARTITION OF {HISTORY_TABLE}
+        FOR VALUES FROM ('{start}') TO ('{next_month(start)}')
+    """))
+
+
+def write_scores(conn, records):
+    """Append a run's score rows to the history and upsert them into the latest-score table."""
+    dates = sorted({r["scoring_date"] for r in records})
+    for day in dates:
+        ensure_partition(conn, day)
+    # Re-running a scoring date replaces its rows instead of colliding with them
+    conn.execute(text(f"DELETE FROM {HISTORY_TABLE} WHERE scoring_date = ANY(:dates)"), {"dates": dates})
+    conn.execute(text(f"""
+        INSERT INTO {HISTORY_TABLE} ({", ".join(SCORE_COLUMNS)})
+        VALUES ({", ".join(f":{c}" for c in SCORE_COLUMNS)})
+    """), records)
+    updates = ", ".join(f"{c} = excluded.{c}" for c in SCORE_COLUMNS[1:])
+    for day in dates:
+        # One date per statement: a user may be upserted only once per INSERT ... ON CONFLICT
+        conn.execute(text(f"""
+            INSERT INTO {LATEST_TABLE} ({", ".join(SCORE_COLUMNS)}, scored_at)
+            SELECT {", ".join(SCORE_COLUMNS)}, scored_at FROM {HISTORY_TABLE} WHERE scoring_date = :day
+            ON CONFLICT (user_id) DO UPDATE SET {updates}, scored_at = excluded.scored_at
+            WHERE excluded.scoring_date >= {LATEST_TABLE}.scoring_date
+        """), {"day": day})
+    # Users who dropped out of the newest run keep only their history rows. After the upsert the
+    # latest table's max is the newest run's date (also when an older date is re-scored), read
+    # through its scoring_date index instead of scanning every history partition.
+    conn.execute(text(f"""
+        DELETE FROM {LATEST_TABLE}
+        WHERE scoring_date < (SELECT max(scoring_date) FROM {LATEST_TABLE})
+    """))
+    return dates
+
+
+def drop_expired_partitions(conn, retention_days, newest):
+    """Drop monthly partitions that end more than ``retention_days`` before ``newest``.
+
+    ``newest`` is the newest date the current run wrote; partitions are listed from the
+    catalog, so the cost does not grow with the rows kept in the history.
+    """
+    partitions = conn.execute(text("""
+        SELECT c.relname
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(:table)
+    """), {"table": HISTORY_TABLE}).scalars().all()
+    dropped = []
+    for name in sorted(partitions):
+        suffix = name.rsplit("_p", 1)[-1]
+        if len(suffix) != 6 or not suffix.isdigit():
+            continue
+        start = date(int(suffix[:4]), int(suffix[4:]), 1)
+        if (newest - next_month(start)).days > retention_days:
+            conn.execute(text(f"DROP TABLE analytics.{name}"))
+            dropped.append(name)
+    return dropped
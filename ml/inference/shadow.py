@@ -0,0 +1,143 @@
+"""Off-path shadow scoring for a challenger model.
+
+``ShadowScorer.submit`` only enqueues (non-blocking; the request is dropped and
+counted if the queue is full), so the served response never waits on the
+challenger. A background thread drains the queue in batches - up to
+``batch_size`` rows or ``flush_seconds`` - scores each batch with one predict
+call and appends the results to ``analytics.shadow_scores``. The serving process
+only inserts: the table is created with the score tables by batch_score.py
+(``score_store.ensure_score_tables``), and ``shadow_table_exists`` lets the API
+skip shadow scoring when it is missing.
+
+When the challenger shares the served model's encoding (same feature spec),
+the already encoded row is passed along and only stacked, not re-encoded.
+"""
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+from sqlalchemy import text
+
+from ml.inference.score_store import SHADOW_TABLE
+
+
+def shadow_table_exists(engine):
+    with engine.connect() as conn:
+        return conn.execute(text("SELECT to_regclass(:table) IS NOT NULL"), {"table": SHADOW_TABLE}).scalar()
+
+
+class ShadowScorer:
+    def __init__(self, name, model, version, engine, batch_size=256, flush_seconds=2.0, max_queue=10000):
+        self.name = name
+        self.model = model
+        self.version = str(version)
+        self.engine = engine
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.lock = threading.Lock()
+        self.stats = {"queued": 0, "dropped": 0, "written": 0, "errors": 0}
+        self.stopping = False
+        self.thread = threading.Thread(target=self._run, name=f"shadow-{name}", daemon=True)
+        self.thread.start()
+
+    def submit(self, user_id, row, X, served_variant, served_version, served_probability):
+        """Queue one served request for shadow scoring; ``X`` is the shared encoding or None."""
+        item = {
+            "scored_at": datetime.now(timezone.utc),
+            "user_id": user_id,
+            "row": row,
+            "X": X,
+            "served_variant": served_variant,
+            "served_version": str(served_version),
+            "served_probability": served_probability,
+        }
+        try:
+            self.queue.put_nowait(item)
+            key = "queued"
+        except queue.Full:
+            key = "dropped"
+        with self.lock:
+            self.stats[key] += 1
+
+    def _next_batch(self):
+        first = self.queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + self.flush_seconds
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is None:
+                # Flush what we have, then stop
+                self.stopping = True
+                break
+            batch.append(item)
+        return batch
+
+    def _score(self, batch):
+        probs = np.empty(len(batch), dtype=np.float64)
+        shared = [i for i, item in enumerate(batch) if item["X"] is not None]
+        fresh = [i for i, item in enumerate(batch) if item["X"] is None]
+        if shared:
+            probs[shared] = self.model.predict(self.model.concat([batch[i]["X"] for i in shared]))
+        if fresh:
+            probs[fresh] = self.model.predict(self.model.encode(batch[i]["row"] for i in fresh))
+        return probs
+
+    def _write(self, batch, probs):
+        records = [
+            {
+                "scored_at": item["scored_at"],
+                "user_id": item["user_id"],
+                "served_variant": item["served_variant"],
+                "served_version": item["served_version"],
+                "served_probability": item["served_probability"],
+                "shadow_variant": self.name,
+                "shadow_version": self.version,
+                "shadow_probability": float(p),
+            }
+            for item, p in zip(batch, probs)
+        ]
+        with self.engine.begin() as conn:
+            conn.execute(text(f"""
+                INSERT INTO {SHADOW_TABLE} (scored_at, user_id, served_variant, served_version, served_probability,
+                                            shadow_variant, shadow_version, shadow_probability)
+                VALUES (:scored_at, :user_id, :served_variant, :served_version, :served_probability,
+                        :shadow_variant, :shadow_version, :shadow_probability)
+            """), records)
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                self._write(batch, self._score(batch))
+                key, n = "written", len(batch)
+            except Exception as e:
+                print(f"Shadow scoring error ({self.name}): {e}")
+                # Every row of the failed batch is lost, so the error rate stays per row
+                key, n = "errors", len(batch)
+            with self.lock:
+                self.stats[key] += n
+            if self.stopping:
+                return
+
+    def close(self, timeout=10):
+        """Flush queued rows and stop the worker."""
+        self.queue.put(None)
+        self.thread.join(timeout)
+
+    def snapshot(self):
+        with self.lock:
+            stats = dict(self.stats)
+        return {"variant": self.name, "version": self.version, "pending": self.queue.qsize(), **stats}
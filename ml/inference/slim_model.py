@@ -0,0 +1,79 @@
+"""Pandas-free model runtime for the slim serving mode.
+
+A serving bundle (written by ``export_bundle.py``) is a directory holding the
+native XGBoost booster, the ``feature_spec.json`` sidecar, the optional
+``reference_histograms.json`` and a ``bundle.json`` manifest. Loading it needs
+no MLflow client or tracking server, and request rows are encoded straight from
+dicts into a float32 matrix without building DataFrames.
+
+pandas is not avoided at import time: xgboost 1.7.6 (``xgboost/compat.py``)
+imports it whenever it is installed, which it is here (about 0.23s of the ~0.4s
+``import xgboost``). The saving over the mlflow mode is the MLflow import and
+model download, not pandas.
+
+Categorical columns are passed as their index in the frozen training vocabulary
+(``feature_types="c"``), which is exactly the pandas category code the model was
+trained on; unseen values become NaN, as in ``ml.feature_spec.encode``. Checked
+on xgboost 1.7.6 / pandas 2.2 / NumPy 1.26: for depth-9, 200-tree boosters with
+both partition-based (``max_cat_to_onehot=1``) and one-hot categorical splits,
+predictions from this NumPy path, batched and row by row, including unseen and
+missing categories and after a UBJSON save/load, are identical to
+``predict_proba`` on the pandas-categorical frame (max abs difference 0.0).
+"""
+import json
+import os
+
+import numpy as np
+import xgboost as xgb
+
+BUNDLE_FILE = "bundle.json"
+
+
+class SlimModel:
+    def __init__(self, booster, spec, manifest):
+        self.booster = booster
+        self.spec = spec
+        self.manifest = manifest
+        self.numeric = list(spec["numeric"])
+        self.categorical = [(col, {v: i for i, v in enumerate(vocab)}) for col, vocab in spec["categorical"].items()]
+        self.feature_names = self.numeric + [col for col, _ in self.categorical]
+        self.feature_types = ["float"] * len(self.numeric) + ["c"] * len(self.categorical)
+        # Models with equal keys accept the same encoded matrix
+        self.encoding_key = json.dumps(spec, sort_keys=True)
+
+    def encode(self, rows):
+        """Encode an iterable of feature dicts into the (rows x features) model matrix."""
+        rows = list(rows)
+        X = np.full((len(rows), len(self.feature_names)), np.nan, dtype=np.float32)
+        n_numeric = len(self.numeric)
+        for i, row in enumerate(rows):
+            for j, col in enumerate(self.numeric):
+                value = row.get(col)
+                if value is not None:
+                    try:
+                        X[i, j] = float(value)
+                    except (TypeError, ValueError):
+                        pass
+            for k, (col, index) in enumerate(self.categorical):
+                code = index.get(row.get(col))
+                if code is not None:
+                    X[i, n_numeric + k] = code
+        return X
+
+    def concat(self, parts):
+        return np.vstack(parts)
+
+    def predict(self, X):
+        dmatrix = xgb.DMatrix(X, feature_names=self.feature_names, feature_types=self.feature_types,
+                              enable_categorical=True)
+        return self.booster.predict(dmatrix)
+
+
+def load_bundle(directory):
+    """Load a SlimModel from an exported serving bundle directory."""
+    with open(os.path.join(directory, BUNDLE_FILE)) as f:
+        manifest = json.load(f)
+    with open(os.path.join(directory, manifest["spec_file"])) as f:
+        spec = json.load(f)
+    booster = xgb.Booster(model_file=os.path.join(directory, manifest["model_file"]))
+    return SlimModel(booster, spec, manifest)
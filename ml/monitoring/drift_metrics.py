@@ -0,0 +1,62 @@
+"""Vectorized drift statistics over binned counts.
+
+Every function takes count matrices shaped (n_features, n_bins) - one row per
+feature, reference and current on the same bin layout - and returns one score
+per feature. Only NumPy is imported, so the serving process can use this too.
+"""
+import numpy as np
+
+EPS = 1e-6
+
+# Conventional PSI bands
+PSI_MODERATE = 0.1
+PSI_SIGNIFICANT = 0.2
+
+
+def _proportions(counts):
+    counts = np.asarray(counts, dtype=np.float64)
+    totals = counts.sum(axis=-1, keepdims=True)
+    return counts / np.where(totals == 0, 1.0, totals)
+
+
+def psi(ref_counts, cur_counts, eps=EPS):
+    """Population Stability Index per feature."""
+    p = np.clip(_proportions(ref_counts), eps, None)
+    q = np.clip(_proportions(cur_counts), eps, None)
+    return np.sum((q - p) * np.log(q / p), axis=-1)
+
+
+def ks(ref_counts, cur_counts):
+    """Two-sample Kolmogorov-Smirnov statistic on the binned CDFs (ordered bins only)."""
+    cdf_p = np.cumsum(_proportions(ref_counts), axis=-1)
+    cdf_q = np.cumsum(_proportions(cur_counts), axis=-1)
+    return np.max(np.abs(cdf_p - cdf_q), axis=-1)
+
+
+def js_divergence(ref_counts, cur_counts):
+    """Jensen-Shannon divergence (base 2, bounded in [0, 1])."""
+    p = _proportions(ref_counts)
+    q = _proportions(cur_counts)
+    m = 0.5 * (p + q)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        kl_pm = np.where(p > 0, p * np.log2(p / m), 0.0)
+        kl_qm = np.where(q > 0, q * np.log2(q / m), 0.0)
+    return 0.5 * kl_pm.sum(axis=-1) + 0.5 * kl_qm.sum(axis=-1)
+
+
+def quantiles(counts, edges, qs):
+    """Approximate quantiles of one fixed-width histogram by linear interpolation.
+
+    ``counts`` covers the ``len(edges) - 1`` inner bins; ``edges`` are the bin edges.
+    """
+    counts = np.asarray(counts, dtype=np.float64)
+    total = counts.sum()
+    if total == 0:
+        return np.full(len(qs), np.nan)
+    cdf = np.concatenate([[0.0], np.cumsum(counts) / total])
+    return np.interp(qs, cdf, edges)
+
+
+def drift_status(psi_values):
+    return np.where(psi_values >= PSI_SIGNIFICANT, "drift",
+                    np.where(psi_values >= PSI_MODERATE, "moderate", "stable"))
@@ -1,9 +1,14 @@
 import pandas as pd
 import numpy as np
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 import os
+import sys
+import json
 import matplotlib.pyplot as plt
-import seaborn as sns
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from ml.feature_spec import NUMERIC_FEATURES, CATEGORICAL_FEATURES
+from ml.monitoring.drift_metrics import psi, ks, js_divergence, drift_status
 
 # Database Connection
 db_user = os.getenv('POSTGRES_USER', 'user')
@@ -15,53 +20,145 @@ db_name = os.getenv('POSTGRES_DB', 'ecom')
 connection_str = f"postgresql+psycopg2://{db_user}:{db_pass}@{db_host}:{db_port}/{db_name}"
 engine = create_engine(connection_str)
 
+REFERENCE_TABLE = "public_marts.churn_features"
+CURRENT_TABLE = "public_marts.churn_scoring"
+N_BINS = int(os.getenv("DRIFT_BINS", "20"))
+
+# Histograms are computed inside Postgres: only (feature, bucket, count) rows leave the database.
+# Numeric bucket layout per feature: 0 = below reference min, 1..N_BINS = fixed-width bins over the
+# reference [min, max], N_BINS + 1 = above reference max, N_BINS + 2 = NULL.
+# width_bucket(x, lo, hi, N) puts x == hi in N + 1, so hi is passed as the next float above the
+# reference max: the max itself then lands in bin N_BINS and only values above it overflow.
+
+def get_reference_ranges():
+    selects = ", ".join(f"min({f})::float8, max({f})::float8" for f in NUMERIC_FEATURES)
+    with engine.connect() as conn:
+        row = conn.execute(text(f"SELECT {selects} FROM {REFERENCE_TABLE}")).fetchone()
+    ranges = {}
+    for i, feat in enumerate(NUMERIC_FEATURES):
+        lo, hi = row[2 * i], row[2 * i + 1]
+        lo = 0.0 if lo is None else lo
+        hi = lo + 1.0 if hi is None or hi <= lo else hi  # width_bucket needs lo < hi
+        ranges[feat] = (lo, float(np.nextafter(hi, np.inf)))
+    return ranges
+
+def numeric_histograms(table, ranges):
+    values = ",\n            ".join(
+        f"('{f}', coalesce(width_bucket(t.{f}::float8, {lo!r}, {hi!r}, {N_BINS}), {N_BINS + 2}))"
+        for f, (lo, hi) in ranges.items()
+    )
+    query = f"""
+        SELECT v.feature, v.bucket, count(*) AS n
+        FROM {table} t
+        CROSS JOIN LATERAL (VALUES
+            {values}
+        ) AS v(feature, bucket)
+        GROUP BY 1, 2
+    """
+    counts = np.zeros((len(ranges), N_BINS + 3), dtype=np.int64)
+    index = {f: i for i, f in enumerate(ranges)}
+    with engine.connect() as conn:
+        for feature, bucket, n in conn.execute(text(query)):
+            counts[index[feature], bucket] = n
+    return counts
+
+def categorical_counts(table):
+    values = ", ".join(f"('{f}', t.{f}::text)" for f in CATEGORICAL_FEATURES)
+    query = f"""
+        SELECT v.feature, coalesce(v.value, '(null)') AS value, count(*) AS n
+        FROM {table} t
+        CROSS JOIN LATERAL (VALUES {values}) AS v(feature, value)
+        GROUP BY 1, 2
+    """
+    counts = {f: {} for f in CATEGORICAL_FEATURES}
+    with engine.connect() as conn:
+        for feature, value, n in conn.execute(text(query)):
+            counts[feature][value] = n
+    return counts
+
+def align_categorical(ref_counts, cur_counts):
+    """Pad per-feature category counts onto a shared (features x categories) layout."""
+    vocabs = {f: sorted(set(ref_counts[f]) | set(cur_counts[f])) for f in CATEGORICAL_FEATURES}
+    width = max((len(v) for v in vocabs.values()), default=1)
+    ref = np.zeros((len(CATEGORICAL_FEATURES), width), dtype=np.int64)
+    cur = np.zeros_like(ref)
+    for i, f in enumerate(CATEGORICAL_FEATURES):
+        for j, value in enumerate(vocabs[f]):
+            ref[i, j] = ref_counts[f].get(value, 0)
+            cur[i, j] = cur_counts[f].get(value, 0)
+    return ref, cur, vocabs
+
+def compute_drift():
+    ranges = get_reference_ranges()
+    ref_num = numeric_histograms(REFERENCE_TABLE, ranges)
+    cur_num = numeric_histograms(CURRENT_TABLE, ranges)
+    ref_cat, cur_cat, vocabs = align_categorical(categorical_counts(REFERENCE_TABLE), categorical_counts(CURRENT_TABLE))
+
+    # NULL bucket is unordered, so KS only looks at the ordered buckets
+    num_psi = psi(ref_num, cur_num)
+    cat_psi = psi(ref_cat, cur_cat)
+    results = pd.DataFrame({
+        "feature": NUMERIC_FEATURES + CATEGORICAL_FEATURES,
+        "type": ["numeric"] * len(NUMERIC_FEATURES) + ["categorical"] * len(CATEGORICAL_FEATURES),
+        "psi": np.concatenate([num_psi, cat_psi]),
+        "ks": np.concatenate([ks(ref_num[:, :-1], cur_num[:, :-1]), np.full(len(CATEGORICAL_FEATURES), np.nan)]),
+        "js": np.concatenate([js_divergence(ref_num, cur_num), js_divergence(ref_cat, cur_cat)]),
+    })
+    results["status"] = drift_status(results["psi"].to_numpy())
+    histograms = {"ranges": ranges, "ref_num": ref_num, "cur_num": cur_num}
+    return results, histograms, int(ref_num[0].sum()), int(cur_num[0].sum())
+
+def plot_histograms(histograms, path):
+    n = len(NUMERIC_FEATURES)
+    cols = 2
+    rows = (n + cols - 1) // cols
+    fig, axes = plt.subplots(rows, cols, figsize=(12, 3 * rows))
+    for ax, (i, feat) in zip(axes.flat, enumerate(NUMERIC_FEATURES)):
+        ref = histograms["ref_num"][i, 1:N_BINS + 1]
+        cur = histograms["cur_num"][i, 1:N_BINS + 1]
+        lo, hi = histograms["ranges"][feat]
+        edges = np.linspace(lo, hi, N_BINS + 1)
+        ax.stairs(ref / max(ref.sum(), 1), edges, label='Training (Ref)', color='blue')
+        ax.stairs(cur / max(cur.sum(), 1), edges, label='Inference (Curr)', color='red')
+        ax.set_title(feat)
+        ax.legend(fontsize=7)
+    for ax in list(axes.flat)[n:]:
+        ax.axis('off')
+    plt.tight_layout()
+    plt.savefig(path)
+    plt.close(fig)
+
 def generate_drift_report():
     print("Generating Drift Report...")
-    
-    # 1. Load Reference Data (Training)
-    print("Loading Training Data (Reference)...")
-    train_df = pd.read_sql("SELECT * FROM public_marts.churn_features", engine)
-    
-    # 2. Load Current Data (Inference)
-    print("Loading Inference Data (Current)...")
-    score_df = pd.read_sql("SELECT * FROM public_marts.churn_scoring", engine)
-    
-    # 3. Compare Distributions
+    print("Computing histograms in Postgres (Training vs Inference)...")
+    results, histograms, train_rows, score_rows = compute_drift()
+
     report_path = "reports/drift_report.html"
-    
-    # Features to check
-    features = ['recency_days', 'frequency_60d', 'total_events', 'view_count']
-    
+    plot_histograms(histograms, "reports/drift_histograms.png")
+
     # Create HTML
     html_content = "<html><head><title>Drift Report</title></head><body>"
     html_content += "<h1>Data Drift Report: Training vs Inference</h1>"
-    html_content += f"<p>Training Rows: {len(train_df)} | Inference Rows: {len(score_df)}</p>"
-    
-    for feat in features:
-        plt.figure(figsize=(10, 5))
-        sns.kdeplot(train_df[feat], label='Training (Ref)', shade=True, color='blue')
-        sns.kdeplot(score_df[feat], label='Inference (Curr)', shade=True, color='red')
-        plt.title(f"Distribution: {feat}")
-        plt.legend()
-        
-        img_path = f"reports/{feat}_drift.png"
-        plt.savefig(img_path)
-        plt.close()
-        
-        # Calculate Shift (Simple Mean difference)
-        train_mean = train_df[feat].mean()
-        curr_mean = score_df[feat].mean()
-        drift_perc = ((curr_mean - train_mean) / train_mean) * 100
-        
-        html_content += f"<h2>Feature: {feat}</h2>"
-        html_content += f"<p>Train Mean: {train_mean:.2f} | Current Mean: {curr_mean:.2f} | Shift: {drift_perc:.1f}%</p>"
-        html_content += f"<img src='{feat}_drift.png' width='600'><br><hr>"
-        
+    html_content += f"<p>Training Rows: {train_rows} | Inference Rows: {score_rows} | Bins: {N_BINS}</p>"
+    html_content += results.to_html(index=False, float_format=lambda v: f"{v:.4f}", na_rep="-")
+    html_content += "<p>PSI &ge; 0.1 = moderate, &ge; 0.2 = drift. KS is computed on ordered numeric bins only.</p>"
+    html_content += "<img src='drift_histograms.png' width='900'>"
     html_content += "</body></html>"
-    
+
     with open(report_path, "w") as f:
         f.write(html_content)
-        
+
+    summary = {
+        "training_rows": train_rows,
+        "inference_rows": score_rows,
+        "bins": N_BINS,
+        "features": json.loads(results.to_json(orient="records")),
+    }
+    with open("reports/drift_summary.json", "w") as f:
+        json.dump(summary, f, indent=2)
+
+    for row in results.itertuples():
+        print(f"{row.feature:20s} PSI={row.psi:.4f} JS={row.js:.4f} [{row.status}]")
     print(f"Report saved to {report_path}")
 
 if __name__ == "__main__":
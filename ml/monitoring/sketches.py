@@ -0,0 +1,181 @@
+"""Constant-memory streaming histograms for online drift monitoring.
+
+The bin layout matches ``drift_report.py``: for numeric features bucket 0 is
+below the reference minimum, 1..N are fixed-width bins over the reference
+[min, max], N+1 is above the maximum and N+2 is missing. Categorical features
+get one bucket per training category plus a final unknown/missing bucket.
+
+A reference histogram is built at training time (``build_reference``) and
+logged next to the model as ``reference_histograms.json``. In the serving
+process a ``DriftMonitor`` bins each served row in O(1) per feature and keeps a
+rolling window made of a ring of sub-window count arrays, so memory is fixed
+no matter how many requests are observed.
+"""
+import json
+import math
+import os
+import threading
+import time
+
+import numpy as np
+
+from ml.monitoring.drift_metrics import psi, quantiles, drift_status
+
+REFERENCE_FILE = "reference_histograms.json"
+PREDICTION_KEY = "churn_probability"
+
+
+def _numeric_layout(values, n_bins, lo=None, hi=None):
+    values = np.asarray(values, dtype=np.float64)
+    finite = values[~np.isnan(values)]
+    if lo is None:
+        lo = float(finite.min()) if finite.size else 0.0
+        hi = float(finite.max()) if finite.size else 1.0
+        # Upper edge just above the max, so the max falls in bin N (as drift_report.py does)
+        hi = float(np.nextafter(hi, np.inf))
+    if hi <= lo:
+        hi = lo + 1.0
+    counts = np.zeros(n_bins + 3, dtype=np.int64)
+    missing = np.isnan(values)
+    inner = values[~missing]
+    idx = np.floor((inner - lo) / (hi - lo) * n_bins).astype(np.int64) + 1
+    # Like Postgres' width_bucket: values below hi never round up into the overflow bucket
+    idx = np.where(inner < hi, np.minimum(idx, n_bins), n_bins + 1)
+    idx = np.clip(idx, 0, n_bins + 1)
+    np.add.at(counts, idx, 1)
+    counts[n_bins + 2] = missing.sum()
+    return {"lo": lo, "hi": hi, "counts": counts.tolist()}
+
+
+def build_reference(X, spec, probabilities, n_bins=20):
+    """Reference histograms for every model feature and the predicted probability.
+
+    ``probabilities`` should be out-of-sample (test-split) predictions, so the reference
+    matches the confidence of served scores; it need not align row-wise with ``X``.
+    """
+    reference = {"bins": n_bins, "numeric": {}, "categorical": {}}
+    for col in spec["numeric"]:
+        reference["numeric"][col] = _numeric_layout(X[col].to_numpy(dtype=np.float64), n_bins)
+    for col, vocab in spec["categorical"].items():
+        codes = X[col].cat.codes.to_numpy()
+        counts = np.bincount(np.where(codes < 0, len(vocab), codes), minlength=len(vocab) + 1)
+        reference["categorical"][col] = {"categories": list(vocab), "counts": counts.tolist()}
+    reference["prediction"] = _numeric_layout(probabilities, n_bins, lo=0.0, hi=float(np.nextafter(1.0, np.inf)))
+    return reference
+
+
+def save_reference(reference, directory):
+    with open(os.path.join(directory, REFERENCE_FILE), "w") as f:
+        json.dump(reference, f)
+
+
+def load_reference(directory):
+    path = os.path.join(directory, REFERENCE_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+class RollingHistogram:
+    """Fixed-size ring of sub-window histograms plus their running sum."""
+
+    def __init__(self, n_buckets, window_seconds, n_windows):
+        self.n_buckets = n_buckets
+        self.slot_seconds = window_seconds / n_windows
+        self.slots = [[0] * n_buckets for _ in range(n_windows)]
+        self.total = [0] * n_buckets
+        self.current = 0
+        self.slot_start = time.monotonic()
+
+    def _rotate(self, now):
+        # Amortised O(1): at most one O(bins) subtraction per elapsed sub-window
+        steps = int((now - self.slot_start) // self.slot_seconds)
+        for _ in range(min(steps, len(self.slots))):
+            self.current = (self.current + 1) % len(self.slots)
+            expired = self.slots[self.current]
+            for i, n in enumerate(expired):
+                if n:
+                    self.total[i] -= n
+                    expired[i] = 0
+        if steps:
+            self.slot_start += steps * self.slot_seconds
+
+    def add(self, bucket, now):
+        self._rotate(now)
+        self.slots[self.current][bucket] += 1
+        self.total[bucket] += 1
+
+    def counts(self, now):
+        self._rotate(now)
+        return list(self.total)
+
+
+class DriftMonitor:
+    def __init__(self, reference, window_seconds=3600, n_windows=12):
+        self.reference = reference
+        self.n_bins = reference["bins"]
+        self.lock = threading.Lock()
+        self.numeric = {}
+        for col, ref in reference["numeric"].items():
+            self.numeric[col] = (ref["lo"], (ref["hi"] - ref["lo"]) / self.n_bins, ref["hi"])
+        prediction = reference["prediction"]
+        self.numeric[PREDICTION_KEY] = (prediction["lo"], (prediction["hi"] - prediction["lo"]) / self.n_bins,
+                                        prediction["hi"])
+        self.categorical = {
+            col: {c: i for i, c in enumerate(ref["categories"])}
+            for col, ref in reference["categorical"].items()
+        }
+        self.histograms = {
+            col: RollingHistogram(self.n_bins + 3, window_seconds, n_windows) for col in self.numeric
+        }
+        for col, index in self.categorical.items():
+            self.histograms[col] = RollingHistogram(len(index) + 1, window_seconds, n_windows)
+        self.window_seconds = window_seconds
+        self.observed = 0
+
+    def _numeric_bucket(self, col, value):
+        try:
+            x = float(value)
+        except (TypeError, ValueError):
+            return self.n_bins + 2
+        if math.isnan(x):
+            return self.n_bins + 2
+        lo, width, hi = self.numeric[col]
+        if x >= hi:
+            return self.n_bins + 1
+        bucket = int((x - lo) // width) + 1
+        return 0 if bucket < 0 else min(bucket, self.n_bins)
+
+    def observe(self, features, probability):
+        """Record one served feature row (raw values) and its prediction."""
+        now = time.monotonic()
+        with self.lock:
+            for col in self.reference["numeric"]:
+                self.histograms[col].add(self._numeric_bucket(col, features.get(col)), now)
+            for col, index in self.categorical.items():
+                self.histograms[col].add(index.get(features.get(col), len(index)), now)
+            self.histograms[PREDICTION_KEY].add(self._numeric_bucket(PREDICTION_KEY, probability), now)
+            self.observed += 1
+
+    def _reference_counts(self, col):
+        if col == PREDICTION_KEY:
+            return self.reference["prediction"]
+        return self.reference["numeric"].get(col) or self.reference["categorical"][col]
+
+    def snapshot(self, qs=(0.5, 0.9, 0.99)):
+        now = time.monotonic()
+        with self.lock:
+            current = {col: h.counts(now) for col, h in self.histograms.items()}
+        report = {"window_seconds": self.window_seconds, "observed_total": self.observed, "features": {}}
+        for col, counts in current.items():
+            ref = self._reference_counts(col)
+            score = float(psi(np.array([ref["counts"]]), np.array([counts]))[0])
+            entry = {"count": int(sum(counts)), "psi": score, "status": str(drift_status(np.array([score]))[0])}
+            if col in self.numeric:
+                edges = np.linspace(ref["lo"], ref["hi"], self.n_bins + 1)
+                inner = counts[1:self.n_bins + 1]
+                entry["quantiles"] = {str(q): float(v) for q, v in zip(qs, quantiles(inner, edges, qs))}
+                entry["out_of_range"] = int(counts[0] + counts[self.n_bins + 1])
+            report["features"][col] = entry
+        return report
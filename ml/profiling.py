@@ -0,0 +1,164 @@
+"""Per-stage time and memory profiling for training and scoring jobs.
+
+Enabled with ``ML_PROFILE=1``; otherwise ``stage`` hands back a shared no-op
+context manager and ``profiled`` returns the function undecorated, so
+instrumented scripts pay nothing. When enabled, every named stage records:
+  * wall_s / cpu_s     - perf_counter and process CPU time (all threads, so
+                         XGBoost / BLAS worker time is included),
+  * peak_rss_mb        - peak resident set size during the stage (Linux resets
+                         the VmHWM high-water mark per stage through
+                         /proc/self/clear_refs; elsewhere it is the process
+                         peak so far, flagged as ``rss_scope: "process"``),
+  * py_alloc_peak_mb   - tracemalloc peak of Python/NumPy allocations during
+                         the stage (``ML_PROFILE_TRACEMALLOC=0`` skips it, as
+                         tracing slows allocation-heavy code).
+
+Stages nest (``fit`` inside ``trial`` is recorded as ``trial/fit``) and repeated
+stages aggregate (calls, summed times, max peaks). ``log_profile`` writes the
+table as ``profile.<stage>.<metric>`` MLflow metrics plus a ``profile.json``
+artifact on the active run, or on a new run named ``run_name``.
+
+Usage:
+    with stage("load"):
+        df = load_training_set(engine)
+
+    @profiled("trial")
+    def objective(trial): ...
+"""
+import contextlib
+import functools
+import os
+import resource
+import sys
+import time
+import tracemalloc
+
+PROFILE_ENABLED = os.getenv("ML_PROFILE", "0") == "1"
+TRACE_ALLOCATIONS = os.getenv("ML_PROFILE_TRACEMALLOC", "1") == "1"
+
+_NOOP = contextlib.nullcontext()
+
+
+def _reset_rss_peak():
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _rss_peak_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class Profiler:
+    def __init__(self, enabled=PROFILE_ENABLED, trace_allocations=TRACE_ALLOCATIONS):
+        self.enabled = enabled
+        self.trace_allocations = trace_allocations
+        self.records = {}  # stage path -> aggregated measurements
+        self._stack = []
+
+    def stage(self, name):
+        if not self.enabled:
+            return _NOOP
+        return self._measure(name)
+
+    def profiled(self, name=None):
+        """Decorator form of ``stage``; the stage defaults to the function name."""
+        def decorate(func):
+            if not self.enabled:
+                return func
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self._measure(name or func.__name__):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    @contextlib.contextmanager
+    def _measure(self, name):
+        if self.trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if self._stack:
+            # This stage resets the high-water marks, so bank the enclosing stage's peaks so far
+            self._fold_peaks(self._stack[-1], _rss_peak_mb(), self._alloc_peak_mb())
+        frame = {"path": "/".join([f["path"] for f in self._stack[-1:]] + [name]),
+                 "rss": 0.0, "alloc": 0.0}
+        self._stack.append(frame)
+        rss_reset = _reset_rss_peak()
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            self._fold_peaks(frame, _rss_peak_mb(), self._alloc_peak_mb())
+            self._stack.pop()
+            if self._stack:
+                # Inner stage peaks count towards the enclosing stage
+                self._fold_peaks(self._stack[-1], frame["rss"], frame["alloc"])
+            self._record(frame["path"], wall, cpu, frame["rss"], frame["alloc"], rss_reset)
+
+    @staticmethod
+    def _alloc_peak_mb():
+        return tracemalloc.get_traced_memory()[1] / (1024 * 1024) if tracemalloc.is_tracing() else 0.0
+
+    @staticmethod
+    def _fold_peaks(frame, rss, alloc):
+        frame["rss"] = max(frame["rss"], rss)
+        frame["alloc"] = max(frame["alloc"], alloc)
+
+    def _record(self, path, wall, cpu, rss, alloc, rss_reset):
+        record = self.records.setdefault(path, {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "peak_rss_mb": 0.0,
+                                                "py_alloc_peak_mb": 0.0, "rss_scope": "stage"})
+        record["calls"] += 1
+        record["wall_s"] += wall
+        record["cpu_s"] += cpu
+        record["peak_rss_mb"] = max(record["peak_rss_mb"], rss)
+        record["py_alloc_peak_mb"] = max(record["py_alloc_peak_mb"], alloc)
+        if not rss_reset:
+            record["rss_scope"] = "process"
+
+    def summary(self):
+        return {path: {k: round(v, 4) if isinstance(v, float) else v for k, v in r.items()}
+                for path, r in self.records.items()}
+
+    def log_profile(self, run_name=None):
+        """Print the stage table and log it to MLflow (active run, or a new ``run_name`` run)."""
+        if not self.enabled or not self.records:
+            return None
+        import mlflow
+
+        summary = self.summary()
+        print(f"{'stage':<28}{'calls':>6}{'wall s':>10}{'cpu s':>10}{'rss MB':>10}{'alloc MB':>10}")
+        for path, r in summary.items():
+            print(f"{path:<28}{r['calls']:>6}{r['wall_s']:>10.2f}{r['cpu_s']:>10.2f}"
+                  f"{r['peak_rss_mb']:>10.1f}{r['py_alloc_peak_mb']:>10.1f}")
+
+        metrics = {f"profile.{path}.{key}": value for path, r in summary.items()
+                   for key, value in r.items() if key not in ("calls", "rss_scope")}
+        run = mlflow.start_run(run_name=run_name) if mlflow.active_run() is None else contextlib.nullcontext()
+        with run:
+            mlflow.log_metrics(metrics)
+            mlflow.log_dict({"script": os.path.basename(sys.argv[0]), "tracemalloc": tracemalloc.is_tracing(),
+                             "stages": summary}, "profile.json")
+        return summary
+
+
+# Process-wide profiler used by the training / scoring scripts
+profiler = Profiler()
+stage = profiler.stage
+profiled = profiler.profiled
+log_profile = profiler.log_profile
@@ -0,0 +1,204 @@
+"""Versioned on-disk cache of the churn training set.
+
+The training scripts all train on the same ``churn_features JOIN churn_labels``
+result. This module materialises that join once per snapshot into a directory
+of column files (one ``.npy`` per column) and serves later reads from it with
+memory mapping, so a tuning / training cycle only pays for the warehouse query
+when the underlying data or dbt models actually change.
+
+Cache key = ``snapshot_date`` + a fingerprint of
+  * the dbt model SQL that produces the training set (features, labels and the
+    staging models they read),
+  * the storage of every leaf partition of the relations involved (oid,
+    relfilenode and size), which changes whenever dbt rebuilds a mart or the
+    loader rewrites a raw table, and
+  * the exact contents of the two marts the query reads (row count + newest
+    writing transaction id), which catches in-place incremental updates.
+The statistics counters in ``pg_stat_user_tables`` are deliberately not used:
+they are updated asynchronously, reset by ``pg_stat_reset`` and always zero on
+partitioned parents.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = os.getenv("SNAPSHOT_CACHE_DIR", os.path.join(REPO_ROOT, ".cache", "training_snapshots"))
+
+TRAINING_QUERY = """
+SELECT
+    f.*,
+    l.is_churned
+FROM public_marts.churn_features f
+JOIN public_marts.churn_labels l ON f.user_id = l.user_id
+"""
+
+# Bumped when the on-disk layout or column typing changes, so older snapshots are not reused
+CACHE_FORMAT = 2
+
+# dbt models whose SQL defines the training set
+DBT_MODELS = [
+    "dbt/models/marts/ml_features/churn_features.sql",
+    "dbt/models/marts/ml_features/churn_labels.sql",
+    "dbt/models/intermediate/int_user_daily_activity.sql",
+    "dbt/models/staging/stg_orders.sql",
+    "dbt/models/staging/stg_events.sql",
+    "dbt/models/staging/stg_users.sql",
+]
+
+# (schema, table) relations the training set is read from
+SOURCE_TABLES = [
+    ("public_marts", "churn_features"),
+    ("public_marts", "churn_labels"),
+    ("public_intermediate", "int_user_daily_activity"),
+    ("raw", "orders"),
+    ("raw", "events"),
+    ("raw", "users"),
+]
+# Relations TRAINING_QUERY reads: one row per user, so scanning them for the content check is cheap
+QUERY_TABLES = [("public_marts", "churn_features"), ("public_marts", "churn_labels")]
+
+
+def dbt_fingerprint(models=DBT_MODELS):
+    digest = hashlib.sha256()
+    for rel_path in models:
+        digest.update(rel_path.encode())
+        path = os.path.join(REPO_ROOT, rel_path)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+def table_fingerprint(engine, tables=SOURCE_TABLES, content_tables=QUERY_TABLES):
+    # Leaf partitions come from the catalog (no scans); a plain table is its own single leaf
+    storage = text("""
+        SELECT c.oid, c.relfilenode, pg_relation_size(c.oid)
+        FROM pg_partition_tree(to_regclass(:relation)) t
+        JOIN pg_class c ON c.oid = t.relid
+        WHERE t.isleaf
+        ORDER BY c.oid
+    """)
+    digest = hashlib.sha256()
+    with engine.connect() as conn:
+        for schema, table in tables:
+            relation = f"{schema}.{table}"
+            leaves = [tuple(row) for row in conn.execute(storage, {"relation": relation})]
+            digest.update(f"{relation}={leaves};".encode())
+            if leaves and (schema, table) in content_tables:
+                # Any insert or update stamps rows with a newer xmin; deletes change the count
+                row = conn.execute(text(f"SELECT count(*), max(xmin::text::bigint) FROM {relation}")).fetchone()
+                digest.update(f"{relation}:content={tuple(row)};".encode())
+    return digest.hexdigest()
+
+
+def current_snapshot_date(engine):
+    with engine.connect() as conn:
+        value = conn.execute(text("SELECT snapshot_date FROM public_marts.churn_features LIMIT 1")).scalar()
+    return pd.Timestamp(value).strftime("%Y-%m-%d") if value is not None else "unknown"
+
+
+def snapshot_key(engine):
+    snapshot_date = current_snapshot_date(engine)
+    fingerprint = hashlib.sha256(
+        (f"format={CACHE_FORMAT};" + dbt_fingerprint() + table_fingerprint(engine) + TRAINING_QUERY).encode()
+    ).hexdigest()[:16]
+    return f"{snapshot_date}-{fingerprint}"
+
+
+def _write_snapshot(df, path):
+    # Write into a temp dir next to the target and rename, so concurrent readers
+    # never observe a half-written snapshot.
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(dir=os.path.dirname(path), prefix=".tmp-")
+    manifest = {"rows": len(df), "columns": []}
+    for i, col in enumerate(df.columns):
+        series = df[col]
+        entry = {"name": col, "file": f"{i:03d}.npy"}
+        if series.dtype == object and pd.api.types.infer_dtype(series, skipna=True) in ("date", "datetime"):
+            # DATE columns (e.g. snapshot_date) arrive as datetime.date objects; keep them temporal
+            series = pd.to_datetime(series)
+        if series.dtype == object or isinstance(series.dtype, pd.CategoricalDtype):
+            # Strings are stored as int32 codes + vocabulary so they stay mmap-able
+            cat = series.astype("category")
+            entry["kind"] = "category"
+            entry["categories"] = [str(c) for c in cat.cat.categories]
+            values = cat.cat.codes.to_numpy(dtype=np.int32)
+        elif pd.api.types.is_datetime64_any_dtype(series.dtype):
+            entry["kind"] = "datetime"
+            if series.dt.tz is not None:
+                series = series.dt.tz_convert(None)
+            values = series.to_numpy(dtype="datetime64[ns]")
+        else:
+            entry["kind"] = "numeric"
+            values = series.to_numpy()
+        np.save(os.path.join(tmp_dir, entry["file"]), values, allow_pickle=False)
+        manifest["columns"].append(entry)
+    with open(os.path.join(tmp_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f)
+    try:
+        os.rename(tmp_dir, path)
+    except OSError:
+        # Another process published the same snapshot first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _read_manifest(path):
+    with open(os.path.join(path, "manifest.json")) as f:
+        return json.load(f)
+
+
+def load_arrays(path):
+    """Return {column: read-only memory-mapped ndarray} plus the manifest."""
+    manifest = _read_manifest(path)
+    arrays = {
+        c["name"]: np.load(os.path.join(path, c["file"]), mmap_mode="r", allow_pickle=False)
+        for c in manifest["columns"]
+    }
+    return arrays, manifest
+
+
+def load_frame(path):
+    arrays, manifest = load_arrays(path)
+    data = {}
+    for c in manifest["columns"]:
+        values = arrays[c["name"]]
+        if c["kind"] == "category":
+            data[c["name"]] = pd.Categorical.from_codes(values, categories=c["categories"])
+        else:
+            data[c["name"]] = values
+    return pd.DataFrame(data)
+
+
+def materialize(engine, refresh=False):
+    """Ensure the snapshot exists on disk and return its directory."""
+    key = snapshot_key(engine)
+    path = os.path.join(CACHE_DIR, key)
+    if refresh and os.path.isdir(path):
+        shutil.rmtree(path)
+    if os.path.isdir(path):
+        print(f"Training snapshot cache hit: {key}")
+        return path
+    print(f"Training snapshot cache miss: {key}. Querying Postgres...")
+    df = pd.read_sql(TRAINING_QUERY, engine)
+    _write_snapshot(df, path)
+    return path
+
+
+def load_training_set(engine, as_arrays=False, refresh=False):
+    """Load the joined training set through the snapshot cache.
+
+    Returns a DataFrame (string columns as pandas categoricals, DATE / timestamp
+    columns as datetime64[ns]) or, with ``as_arrays=True``, a dict of
+    memory-mapped numpy arrays.
+    """
+    path = materialize(engine, refresh=refresh)
+    if as_arrays:
+        return load_arrays(path)[0]
+    return load_frame(path)
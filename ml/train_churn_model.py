@@ -5,11 +5,15 @@ import mlflow.xgboost
 import shap
 import matplotlib.pyplot as plt
 import os
+import sys
 from sqlalchemy import create_engine
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score, precision_score, recall_score, roc_auc_score, confusion_matrix
 from imblearn.over_sampling import SMOTE
 
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from ml.profiling import log_profile, stage
+
 # Database Connection
 db_user = os.getenv('POSTGRES_USER', 'user')
 db_pass = os.getenv('POSTGRES_PASSWORD', 'password')
@@ -22,7 +26,8 @@ engine = create_engine(connection_str)
 
 def train_model():
     print("Loading data from mart_churn_features...")
-    df = pd.read_sql("SELECT * FROM public_marts.mart_churn_features", engine)
+    with stage("load"):
+        df = pd.read_sql("SELECT * FROM public_marts.mart_churn_features", engine)
     
     # Feature Selection
     features = ['recency_days', 'frequency', 'monetary', 'avg_order_value', 'tenure_days']
@@ -39,8 +44,9 @@ def train_model():
     
     # Handle Imbalance (SMOTE)
     print("Applying SMOTE to handle class imbalance...")
-    smote = SMOTE(random_state=42)
-    X_train_resampled, y_train_resampled = smote.fit_resample(X_train, y_train)
+    with stage("smote"):
+        smote = SMOTE(random_state=42)
+        X_train_resampled, y_train_resampled = smote.fit_resample(X_train, y_train)
     
     # MLflow Experiment
     mlflow.set_experiment("churn_prediction")
@@ -59,11 +65,13 @@ def train_model():
         mlflow.log_params(params)
         
         model = xgb.XGBClassifier(**params)
-        model.fit(X_train_resampled, y_train_resampled)
+        with stage("fit"):
+            model.fit(X_train_resampled, y_train_resampled)
         
         # Predictions
-        y_pred = model.predict(X_test)
-        y_prob = model.predict_proba(X_test)[:, 1]
+        with stage("evaluate"):
+            y_pred = model.predict(X_test)
+            y_prob = model.predict_proba(X_test)[:, 1]
         
         # Metrics
         acc = accuracy_score(y_test, y_pred)
@@ -82,21 +90,24 @@ def train_model():
         mlflow.log_metric("auc", auc)
         
         # Log Model (Use sklearn flavor for Wrapper)
-        mlflow.sklearn.log_model(model, "model")
+        with stage("log_model"):
+            mlflow.sklearn.log_model(model, "model")
         
         # Explainability (SHAP)
         print("Generating SHAP plots...")
-        explainer = shap.Explainer(model)
-        shap_values = explainer(X_test)
-        
-        # Summary Plot
-        plt.figure()
-        shap.summary_plot(shap_values, X_test, show=False)
-        plt.savefig("shap_summary.png", bbox_inches='tight')
-        mlflow.log_artifact("shap_summary.png")
-        plt.close()
+        with stage("shap"):
+            explainer = shap.Explainer(model)
+            shap_values = explainer(X_test)
+            
+            # Summary Plot
+            plt.figure()
+            shap.summary_plot(shap_values, X_test, show=False)
+            plt.savefig("shap_summary.png", bbox_inches='tight')
+            mlflow.log_artifact("shap_summary.png")
+            plt.close()
         
         print("Training Complete. Model logged to MLflow.")
+        log_profile()
 
 if __name__ == "__main__":
     train_model()
@@ -0,0 +1,204 @@
+"""Distil the registered advanced model into a compact serving model.
+
+The advanced model (depth 9, 200 trees) is far larger than a dozen features
+need. This step loads the latest ``churn_prediction_advanced`` version as the
+teacher, re-creates its train/test split from the snapshot cache and searches
+candidate students from smallest to largest:
+  * soft-label students - fresh shallow ensembles trained on the teacher's
+    predicted probabilities (``binary:logistic`` accepts labels in [0, 1]),
+  * truncated teachers - the first k trees of the teacher itself.
+
+Candidates are ranked by total tree nodes; the first one whose held-out AUC and
+AUPRC are within the configured tolerances of the teacher's is registered as
+``churn_prediction_compact`` (with the teacher's feature spec and its own
+reference histograms), so it can be served as a variant:
+``SERVING_VARIANTS=control=latest:90,compact=churn_prediction_compact/latest:10``.
+Per-row and per-batch latency of teacher and student are logged to MLflow.
+
+Usage:
+    python ml/training/distill_model.py [--auc-tolerance 0.005] [--ap-tolerance 0.01]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import mlflow
+import mlflow.xgboost
+import numpy as np
+import xgboost as xgb
+from sklearn.metrics import average_precision_score, roc_auc_score
+from sklearn.model_selection import train_test_split
+from sqlalchemy import create_engine
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from ml.snapshot_cache import load_training_set
+from ml.feature_spec import SPEC_FILE, TARGET, download_model, encode, load_model_dir, predict_proba, save_spec
+from ml.monitoring.sketches import build_reference, save_reference
+
+# Database Connection
+db_user = os.getenv('POSTGRES_USER', 'user')
+db_pass = os.getenv('POSTGRES_PASSWORD', 'password')
+db_host = os.getenv('POSTGRES_HOST', 'postgres')
+db_port = os.getenv('POSTGRES_PORT', '5432')
+db_name = os.getenv('POSTGRES_DB', 'ecom')
+
+connection_str = f"postgresql+psycopg2://{db_user}:{db_pass}@{db_host}:{db_port}/{db_name}"
+engine = create_engine(connection_str)
+
+TEACHER_MODEL = "churn_prediction_advanced"
+COMPACT_MODEL = "churn_prediction_compact"
+
+# Student search space: (max_depth, n_trees)
+STUDENT_GRID = [(depth, trees) for depth in (2, 3, 4, 6) for trees in (10, 25, 50, 100)]
+STUDENT_PARAMS = {
+    "objective": "binary:logistic",
+    "eval_metric": "auc",
+    "learning_rate": 0.3,
+    "tree_method": "hist",
+    "seed": 42,
+}
+# Teacher truncation: first k trees
+TRUNCATION_GRID = [5, 10, 25, 50, 100]
+
+LATENCY_ROWS = 200
+
+
+def tree_nodes(booster):
+    """Total split + leaf nodes across all trees (the model's size and per-row work)."""
+    return sum(len(tree.strip().splitlines()) for tree in booster.get_dump())
+
+
+def evaluate(booster, X, y):
+    prob = predict_proba(booster, X)
+    return roc_auc_score(y, prob), average_precision_score(y, prob)
+
+
+def measure_latency(booster, X, n_rows=LATENCY_ROWS, batch_repeats=5):
+    """Median single-row latency and median full-batch latency, in ms, through the serving path."""
+    rows = X.iloc[:n_rows]
+    predict_proba(booster, rows.iloc[[0]])  # warm-up
+    row_times = []
+    for i in range(len(rows)):
+        started = time.perf_counter()
+        predict_proba(booster, rows.iloc[[i]])
+        row_times.append(time.perf_counter() - started)
+    batch_times = []
+    for _ in range(batch_repeats):
+        started = time.perf_counter()
+        predict_proba(booster, X)
+        batch_times.append(time.perf_counter() - started)
+    return float(np.median(row_times)) * 1000, float(np.median(batch_times)) * 1000
+
+
+def train_student(X_train, soft_labels, depth, n_trees):
+    dtrain = xgb.DMatrix(X_train, label=soft_labels, enable_categorical=True)
+    return xgb.train({**STUDENT_PARAMS, "max_depth": depth}, dtrain, num_boost_round=n_trees)
+
+
+def candidates(teacher, X_train, soft_labels):
+    """Yield (name, params, booster) for every student and truncated teacher."""
+    for depth, n_trees in STUDENT_GRID:
+        yield f"student_d{depth}_t{n_trees}", {"kind": "soft_label", "max_depth": depth, "n_trees": n_trees}, \
+            train_student(X_train, soft_labels, depth, n_trees)
+    n_teacher_trees = teacher.num_boosted_rounds()
+    for k in TRUNCATION_GRID:
+        if k < n_teacher_trees:
+            yield f"truncated_t{k}", {"kind": "truncated", "n_trees": k}, teacher[:k]
+
+
+def distill(auc_tolerance, ap_tolerance):
+    mlflow.set_tracking_uri(os.getenv("MLFLOW_TRACKING_URI", "http://mlflow:5001"))
+    mlflow.set_experiment("churn_prediction_project2")
+
+    client = mlflow.MlflowClient()
+    teacher_version = max(int(v.version) for v in client.search_model_versions(f"name='{TEACHER_MODEL}'"))
+    teacher_dir = download_model(f"models:/{TEACHER_MODEL}/{teacher_version}")
+    teacher, spec = load_model_dir(teacher_dir)
+    if spec is None:
+        raise ValueError(f"{TEACHER_MODEL} v{teacher_version} was logged without {SPEC_FILE}; retrain with train_advanced.py.")
+
+    with mlflow.start_run(run_name="Compact_Distillation"):
+        print("Loading Features and Labels (snapshot cache)...")
+        df = load_training_set(engine)
+        X = encode(df, spec)
+        y = df[TARGET]
+        # Same split as train_advanced.py, so the test rows are unseen by the teacher too
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+
+        teacher_auc, teacher_ap = evaluate(teacher, X_test, y_test)
+        print(f"Teacher v{teacher_version}: AUC {teacher_auc:.4f}, AUPRC {teacher_ap:.4f}, {tree_nodes(teacher)} nodes")
+        mlflow.log_params({"teacher_version": teacher_version, "auc_tolerance": auc_tolerance,
+                           "ap_tolerance": ap_tolerance})
+        mlflow.log_metrics({"teacher_auc": teacher_auc, "teacher_average_precision": teacher_ap,
+                            "teacher_nodes": tree_nodes(teacher)})
+
+        soft_labels = predict_proba(teacher, X_train)
+        results = []
+        for name, params, booster in candidates(teacher, X_train, soft_labels):
+            auc, ap = evaluate(booster, X_test, y_test)
+            within = auc >= teacher_auc - auc_tolerance and ap >= teacher_ap - ap_tolerance
+            results.append({"name": name, **params, "nodes": tree_nodes(booster), "auc": auc,
+                            "average_precision": ap, "within_tolerance": within, "booster": booster})
+            print(f"  {name:<20} nodes {results[-1]['nodes']:>6}  AUC {auc:.4f}  AUPRC {ap:.4f}{'  ok' if within else ''}")
+        mlflow.log_dict({"candidates": [{k: v for k, v in r.items() if k != "booster"} for r in results]},
+                        "distillation_candidates.json")
+
+        accepted = sorted((r for r in results if r["within_tolerance"]), key=lambda r: r["nodes"])
+        if not accepted:
+            mlflow.set_tag("registered", "false")
+            print("No candidate within tolerance of the teacher; nothing registered.")
+            return None
+        best = accepted[0]
+        student = best["booster"]
+
+        teacher_row_ms, teacher_batch_ms = measure_latency(teacher, X_test)
+        student_row_ms, student_batch_ms = measure_latency(student, X_test)
+        print(f"Selected {best['name']}: {best['nodes']} nodes, AUC {best['auc']:.4f}, AUPRC {best['average_precision']:.4f}")
+        print(f"Latency per row {teacher_row_ms:.3f} -> {student_row_ms:.3f} ms, "
+              f"per batch of {len(X_test)} {teacher_batch_ms:.1f} -> {student_batch_ms:.1f} ms")
+
+        mlflow.log_params({"selected": best["name"], "kind": best["kind"], "n_trees": best["n_trees"],
+                           "max_depth": best.get("max_depth", "teacher")})
+        mlflow.log_metrics({
+            "auc": best["auc"],
+            "average_precision": best["average_precision"],
+            "nodes": best["nodes"],
+            "size_ratio": best["nodes"] / tree_nodes(teacher),
+            "teacher_latency_row_ms": teacher_row_ms,
+            "latency_row_ms": student_row_ms,
+            "latency_row_speedup": teacher_row_ms / student_row_ms,
+            "teacher_latency_batch_ms": teacher_batch_ms,
+            "latency_batch_ms": student_batch_ms,
+            "latency_batch_speedup": teacher_batch_ms / student_batch_ms,
+            "batch_rows": len(X_test),
+        })
+
+        # Same artifact layout as train_advanced.py, so batch scoring, export_bundle.py and the API load it unchanged
+        mlflow.xgboost.log_model(student, "model", model_format="ubj")
+        # Held-out predictions, as in train_advanced.py: in-sample ones would read as drift once served
+        reference = build_reference(X_train, spec, predict_proba(student, X_test))
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            save_spec(spec, tmp_dir)
+            save_reference(reference, tmp_dir)
+            mlflow.log_artifacts(tmp_dir, "model")
+        # Registered after the sidecars, as in train_advanced.py
+        mlflow.register_model(f"runs:/{mlflow.active_run().info.run_id}/model", COMPACT_MODEL)
+        mlflow.set_tag("registered", "true")
+        print(f"Compact model registered as {COMPACT_MODEL}.")
+        return best["name"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Distil the advanced churn model into a compact serving model")
+    parser.add_argument("--auc-tolerance", type=float, default=float(os.getenv("DISTILL_AUC_TOLERANCE", "0.005")),
+                        help="max AUC drop vs the teacher")
+    parser.add_argument("--ap-tolerance", type=float, default=float(os.getenv("DISTILL_AP_TOLERANCE", "0.01")),
+                        help="max AUPRC drop vs the teacher")
+    args = parser.parse_args()
+    distill(args.auc_tolerance, args.ap_tolerance)
+
+
+if __name__ == "__main__":
+    main()
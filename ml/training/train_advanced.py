@@ -10,6 +10,14 @@ from sklearn.metrics import roc_auc_score, f1_score, precision_score, recall_sco
 import matplotlib.pyplot as plt
 import seaborn as sns
 import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from ml.snapshot_cache import load_training_set
+from ml.feature_spec import CATEGORICAL_FEATURES, TARGET, build_spec, encode, save_spec
+from ml.monitoring.sketches import build_reference, save_reference
+from ml.profiling import log_profile, stage
 
 # Database Connection
 db_user = os.getenv('POSTGRES_USER', 'user')
@@ -21,16 +29,27 @@ db_name = os.getenv('POSTGRES_DB', 'ecom')
 connection_str = f"postgresql+psycopg2://{db_user}:{db_pass}@{db_host}:{db_port}/{db_name}"
 engine = create_engine(connection_str)
 
+# XGBoost Model (Tuned via Optuna - Sprint 6)
+XGB_PARAMS = {
+    "objective": "binary:logistic",
+    "eval_metric": "auc",
+    "max_depth": 9,
+    "learning_rate": 0.82, 
+    "n_estimators": 200,
+    "scale_pos_weight": 1.008,
+    "gamma": 0.0056,
+    "reg_alpha": 1.08e-06,
+    "reg_lambda": 1.52e-05,
+    "grow_policy": 'depthwise',
+    "random_state": 42,
+    # Native categorical splits (requires the hist tree method)
+    "tree_method": "hist",
+    "enable_categorical": True
+}
+
 def load_data():
-    print("Loading Features and Labels from Postgres...")
-    query = """
-    SELECT 
-        f.*,
-        l.is_churned
-    FROM public_marts.churn_features f
-    JOIN public_marts.churn_labels l ON f.user_id = l.user_id
-    """
-    df = pd.read_sql(query, engine)
+    print("Loading Features and Labels (snapshot cache)...")
+    df = load_training_set(engine)
     return df
 
 def train_advanced():
@@ -38,55 +57,33 @@ def train_advanced():
     mlflow.set_experiment("churn_prediction_project2")
     
     with mlflow.start_run(run_name="Advanced_XGBoost"):
-        df = load_data()
-        
-        # Features
-        numeric_features = ['recency_days', 'frequency_60d', 'frequency_30d', 'tenure_days', 
-                           'total_events', 'view_count', 'cart_count', 'session_count', 'view_to_cart_rate', 'frequency_all_time']
-        categorical_features = ['traffic_source', 'country', 'gender']
-        target = 'is_churned'
-        
-        # Preprocessing (Minimal since XGBoost handles nulls, but we need encoding)
-        X = df[numeric_features + categorical_features].copy()
-        y = df[target]
+        with stage("load"):
+            df = load_data()
         
-        # One-Hot Encoding
-        X = pd.get_dummies(X, columns=categorical_features, drop_first=True)
+        # Features: frozen category vocabulary + float32 numerics (no one-hot expansion)
+        with stage("encode"):
+            spec = build_spec(df)
+            X = encode(df, spec)
+            y = df[TARGET]
         
         # Train/Test Split
         X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
         
-        # Calculate Scale Pos Weight (Imbalance)
-        neg_count = (y_train == 0).sum()
-        pos_count = (y_train == 1).sum()
-        scale_pos_weight = neg_count / pos_count
-        
-        # XGBoost Model (Tuned via Optuna - Sprint 6)
-        params = {
-            "objective": "binary:logistic",
-            "eval_metric": "auc",
-            "max_depth": 9,
-            "learning_rate": 0.82, 
-            "n_estimators": 200,
-            "scale_pos_weight": 1.008,
-            "gamma": 0.0056,
-            "reg_alpha": 1.08e-06,
-            "reg_lambda": 1.52e-05,
-            "grow_policy": 'depthwise',
-            "random_state": 42
-        }
+        params = XGB_PARAMS
         
         mlflow.log_params(params)
         
         model = xgb.XGBClassifier(**params)
         
         print("Training XGBoost...")
-        model.fit(X_train, y_train)
+        with stage("fit"):
+            model.fit(X_train, y_train)
         
         # Evaluate
         print("Evaluating...")
-        y_pred = model.predict(X_test)
-        y_prob = model.predict_proba(X_test)[:, 1]
+        with stage("evaluate"):
+            y_pred = model.predict(X_test)
+            y_prob = model.predict_proba(X_test)[:, 1]
         
         auc = roc_auc_score(y_test, y_prob)
         f1 = f1_score(y_test, y_pred)
@@ -107,23 +104,37 @@ def train_advanced():
         mlflow.log_metric("average_precision", avg_precision)
         
         # Feature Importance (SHAP)
+        # XGBoost's native TreeSHAP handles categorical splits; the last column is the bias term.
         print("Generating SHAP Explanations...")
-        explainer = shap.Explainer(model)
-        shap_values = explainer(X_test)
-        
-        # Summary Plot
-        plt.figure(figsize=(10, 8))
-        shap.summary_plot(shap_values, X_test, show=False)
-        plt.tight_layout()
-        plt.savefig("shap_summary.png")
-        mlflow.log_artifact("shap_summary.png")
-        os.remove("shap_summary.png")
+        booster = model.get_booster()
+        with stage("shap"):
+            shap_values = booster.predict(xgb.DMatrix(X_test, enable_categorical=True), pred_contribs=True)[:, :-1]
+            X_test_plot = X_test.apply(lambda c: c.cat.codes if c.name in CATEGORICAL_FEATURES else c)
+            
+            # Summary Plot
+            plt.figure(figsize=(10, 8))
+            shap.summary_plot(shap_values, X_test_plot, show=False)
+            plt.tight_layout()
+            plt.savefig("shap_summary.png")
+            mlflow.log_artifact("shap_summary.png")
+            os.remove("shap_summary.png")
         
-        # Register Model
         # Register Model (Log Booster to avoid sklearn wrapper issues)
-        booster = model.get_booster()
-        mlflow.xgboost.log_model(booster, "model", registered_model_name="churn_prediction_advanced")
+        # The feature spec is stored inside the model directory so scorers get both in one download.
+        with stage("log_model"):
+            # UBJSON: the legacy .xgb format cannot hold categorical splits
+            mlflow.xgboost.log_model(booster, "model", model_format="ubj")
+            # Reference histograms back the API's online drift monitor: training features, and
+            # held-out predictions (in-sample ones are far more confident than served scores).
+            reference = build_reference(X_train, spec, y_prob)
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                save_spec(spec, tmp_dir)
+                save_reference(reference, tmp_dir)
+                mlflow.log_artifacts(tmp_dir, "model")
+            # Register only once the sidecars are uploaded, so no version is ever visible without its spec
+            mlflow.register_model(f"runs:/{mlflow.active_run().info.run_id}/model", "churn_prediction_advanced")
         print("Model Registered in MLflow.")
+        log_profile()
 
 if __name__ == "__main__":
     train_advanced()
@@ -13,6 +13,11 @@ from sklearn.metrics import roc_auc_score, f1_score, precision_score, recall_sco
 import matplotlib.pyplot as plt
 import seaborn as sns
 import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from ml.snapshot_cache import load_training_set
+from ml.profiling import log_profile, stage
 
 # Database Connection
 db_user = os.getenv('POSTGRES_USER', 'user')
@@ -25,15 +30,8 @@ connection_str = f"postgresql+psycopg2://{db_user}:{db_pass}@{db_host}:{db_port}
 engine = create_engine(connection_str)
 
 def load_data():
-    print("Loading Features and Labels from Postgres...")
-    query = """
-    SELECT 
-        f.*,
-        l.is_churned
-    FROM public_marts.churn_features f
-    JOIN public_marts.churn_labels l ON f.user_id = l.user_id
-    """
-    df = pd.read_sql(query, engine)
+    print("Loading Features and Labels (snapshot cache)...")
+    df = load_training_set(engine)
     print(f"Data Loaded: {df.shape}")
     return df
 
@@ -42,7 +40,8 @@ def train_baseline():
     mlflow.set_experiment("churn_prediction_project2")
     
     with mlflow.start_run(run_name="Baseline_LogReg"):
-        df = load_data()
+        with stage("load"):
+            df = load_data()
         
         # Features
         numeric_features = ['recency_days', 'frequency_60d', 'frequency_30d', 'tenure_days', 
@@ -87,12 +86,14 @@ def train_baseline():
         
         # Train
         print("Training Model...")
-        clf.fit(X_train, y_train)
+        with stage("fit"):
+            clf.fit(X_train, y_train)
         
         # Evaluate
         print("Evaluating...")
-        y_pred = clf.predict(X_test)
-        y_prob = clf.predict_proba(X_test)[:, 1]
+        with stage("evaluate"):
+            y_pred = clf.predict(X_test)
+            y_prob = clf.predict_proba(X_test)[:, 1]
         
         auc = roc_auc_score(y_test, y_prob)
         f1 = f1_score(y_test, y_pred)
@@ -119,8 +120,10 @@ def train_baseline():
         os.remove("confusion_matrix.png")
         
         # Log Model
-        mlflow.sklearn.log_model(clf, "model")
+        with stage("log_model"):
+            mlflow.sklearn.log_model(clf, "model")
         print("Run Complete. Logged to MLflow.")
+        log_profile()
 
 if __name__ == "__main__":
     train_baseline()
@@ -11,6 +11,12 @@ from sklearn.preprocessing import OneHotEncoder
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
 import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from ml.snapshot_cache import load_training_set
+from ml.feature_spec import TARGET, build_spec, encode
+from ml.profiling import log_profile, profiled, stage
 
 # Database Connection
 db_user = os.getenv('POSTGRES_USER', 'user')
@@ -23,40 +29,26 @@ connection_str = f"postgresql+psycopg2://{db_user}:{db_pass}@{db_host}:{db_port}
 engine = create_engine(connection_str)
 
 def load_data():
-    print("Loading Features and Labels from Postgres...")
-    query = """
-    SELECT 
-        f.*,
-        l.is_churned
-    FROM public_marts.churn_features f
-    JOIN public_marts.churn_labels l ON f.user_id = l.user_id
-    """
-    df = pd.read_sql(query, engine)
+    print("Loading Features and Labels (snapshot cache)...")
+    df = load_training_set(engine)
     return df
 
+@profiled("trial")
 def objective(trial):
-    df = load_data()
-    
-    # Features
-    numeric_features = ['recency_days', 'frequency_60d', 'frequency_30d', 'tenure_days', 
-                       'total_events', 'view_count', 'cart_count', 'session_count', 'view_to_cart_rate', 'frequency_all_time']
-    categorical_features = ['traffic_source', 'country', 'gender']
-    target = 'is_churned'
-
-    # Preprocessing (Manual OHE for XGBoost)
-    df_encoded = pd.get_dummies(df, columns=categorical_features, drop_first=True)
-    
-    # Align columns
-    feature_cols = [c for c in df_encoded.columns if c not in ['user_id', 'snapshot_date', target] and c in numeric_features + list(df_encoded.columns)]
+    with stage("load"):
+        df = load_data()
     
-    X = df_encoded[feature_cols]
-    y = df_encoded[target]
+    # Features (native categoricals over the training vocabulary)
+    with stage("encode"):
+        X = encode(df, build_spec(df))
+        y = df[TARGET]
     
     # Search Space
     param = {
         'objective': 'binary:logistic',
         'eval_metric': 'aucpr',
         'booster': 'gbtree',
+        'tree_method': 'hist',
         'lambda': trial.suggest_float('lambda', 1e-8, 1.0, log=True),
         'alpha': trial.suggest_float('alpha', 1e-8, 1.0, log=True),
         'max_depth': trial.suggest_int('max_depth', 1, 9),
@@ -74,12 +66,14 @@ def objective(trial):
         X_train, X_valid = X.iloc[train_index], X.iloc[valid_index]
         y_train, y_valid = y.iloc[train_index], y.iloc[valid_index]
         
-        dtrain = xgb.DMatrix(X_train, label=y_train)
-        dvalid = xgb.DMatrix(X_valid, label=y_valid)
+        dtrain = xgb.DMatrix(X_train, label=y_train, enable_categorical=True)
+        dvalid = xgb.DMatrix(X_valid, label=y_valid, enable_categorical=True)
         
         # Train
-        bst = xgb.train(param, dtrain)
-        preds = bst.predict(dvalid)
+        with stage("fit"):
+            bst = xgb.train(param, dtrain)
+        with stage("evaluate"):
+            preds = bst.predict(dvalid)
         
         # Metric: Average Precision (Good for imbalance)
         score = average_precision_score(y_valid, preds)
@@ -110,6 +104,7 @@ def tune_model():
         # Save best params to file
         with open("ml/best_params.txt", "w") as f:
             f.write(str(trial.params))
+        log_profile()
 
 if __name__ == "__main__":
     tune_model()
@@ -0,0 +1,321 @@
+"""End-to-end scale-factor benchmark for the pipeline.
+
+For each scale factor the harness generates a synthetic TheLook dataset
+(``BASE_USERS`` x scale users with sessions, events, orders and items spanning
+2022-01 .. 2024-01-17), then runs load_data.py, dbt run, train_advanced.py,
+batch_score.py and drift_report.py against a dedicated benchmark database
+(``SCALE_BENCH_DB``, default ecom_bench) with a throwaway MLflow file store,
+so the main database, registry and reports are untouched.
+
+Per stage it records wall time, CPU time and peak RSS (from wait4), the rows
+the stage worked on, rows/s, and Postgres query time: the delta of
+pg_stat_database.active_time for the benchmark database. Each run is appended
+to reports/scale_benchmark_history.jsonl and compared against
+reports/scale_benchmark_baseline.json. The harness flags stages that got slower
+or heavier than the baseline by more than ``--tolerance``, and stages whose
+time grows clearly superlinearly between consecutive scale factors. It exits
+non-zero when anything is flagged.
+
+Usage:
+    python pipelines/benchmarks/scale_benchmark.py --scales 0.1 1 4 [--save-baseline] [--tolerance 0.25]
+"""
+import argparse
+import json
+import math
+import os
+import subprocess
+import sys
+import uuid
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from pipelines.run_pipeline import REPO_ROOT, run_command
+
+# Database Connection
+db_user = os.getenv('POSTGRES_USER', 'user')
+db_pass = os.getenv('POSTGRES_PASSWORD', 'password')
+db_host = os.getenv('POSTGRES_HOST', 'postgres')
+db_port = os.getenv('POSTGRES_PORT', '5432')
+db_name = os.getenv('POSTGRES_DB', 'ecom')
+BENCH_DB = os.getenv("SCALE_BENCH_DB", "ecom_bench")
+
+
+def db_url(database):
+    return f"postgresql+psycopg2://{db_user}:{db_pass}@{db_host}:{db_port}/{database}"
+
+
+WORK_DIR = os.path.join(REPO_ROOT, ".cache", "scale_benchmark")
+HISTORY_PATH = os.path.join(REPO_ROOT, "reports", "scale_benchmark_history.jsonl")
+BASELINE_PATH = os.path.join(REPO_ROOT, "reports", "scale_benchmark_baseline.json")
+
+BASE_USERS = 10_000
+START = np.datetime64("2022-01-01T00:00:00")
+END = np.datetime64("2024-01-17T00:00:00")
+SUPERLINEAR_EXPONENT = 1.3  # time ~ scale^k; k above this between two scales is a scaling cliff
+MIN_FLAG_SECONDS = 1.0  # ignore differences smaller than this (noise on tiny stages)
+
+RAW_ROWS = "SELECT (SELECT count(*) FROM raw.events) + (SELECT count(*) FROM raw.orders) + (SELECT count(*) FROM raw.order_items) + (SELECT count(*) FROM raw.users)"
+PY = sys.executable
+DBT_DIR = os.path.join(REPO_ROOT, "dbt")
+STAGES = [
+    {"name": "load", "cmd": [PY, os.path.join(REPO_ROOT, "pipelines/extract_load/load_data.py")], "rows": RAW_ROWS},
+    {"name": "dbt", "cmd": ["dbt", "run", "--project-dir", DBT_DIR, "--profiles-dir", DBT_DIR], "rows": RAW_ROWS},
+    {"name": "train_advanced", "cmd": [PY, os.path.join(REPO_ROOT, "ml/training/train_advanced.py")],
+     "rows": "SELECT count(*) FROM public_marts.churn_features"},
+    {"name": "batch_score", "cmd": [PY, os.path.join(REPO_ROOT, "ml/inference/batch_score.py")],
+     "rows": "SELECT count(*) FROM public_marts.churn_scoring"},
+    {"name": "drift_report", "cmd": [PY, os.path.join(REPO_ROOT, "ml/monitoring/drift_report.py")],
+     "rows": "SELECT (SELECT count(*) FROM public_marts.churn_features) + (SELECT count(*) FROM public_marts.churn_scoring)"},
+]
+
+
+def _random_times(rng, lo, hi):
+    """Uniform timestamps between per-row bounds (datetime64[s] arrays)."""
+    span = (hi - lo).astype(np.int64)
+    return lo + (rng.random(len(span)) * span).astype("timedelta64[s]")
+
+
+def generate_dataset(scale, out_dir, seed=0):
+    """Write users/products/orders/order_items/events CSVs; returns row counts."""
+    rng = np.random.default_rng(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    n_users = max(int(BASE_USERS * scale), 100)
+    user_ids = np.arange(1, n_users + 1)
+    user_created = _random_times(rng, np.full(n_users, START, dtype="datetime64[s]"),
+                                 np.full(n_users, END - np.timedelta64(60, "D"), dtype="datetime64[s]"))
+    states = np.array(["CA", "NY", "TX", "WA", "FL", "IL"])
+    countries = np.array(["United States", "China", "Brasil", "South Korea", "France", "Germany"])
+    sources = np.array(["Search", "Organic", "Facebook", "Email", "Display"])
+    users = pd.DataFrame({
+        "id": user_ids,
+        "first_name": "User", "last_name": "Bench",
+        "email": [f"user{i}@example.com" for i in user_ids],
+        "age": rng.integers(18, 70, n_users),
+        "gender": rng.choice(["M", "F"], n_users),
+        "state": rng.choice(states, n_users),
+        "street_address": "1 Bench St", "postal_code": "00000", "city": "Bench City",
+        "country": rng.choice(countries, n_users, p=[0.35, 0.3, 0.15, 0.08, 0.06, 0.06]),
+        "latitude": 0.0, "longitude": 0.0,
+        "traffic_source": rng.choice(sources, n_users, p=[0.7, 0.15, 0.06, 0.05, 0.04]),
+        "created_at": user_created,
+    })
+
+    n_products = 500
+    products = pd.DataFrame({
+        "id": np.arange(1, n_products + 1),
+        "cost": rng.uniform(5, 50, n_products).round(2),
+        "category": rng.choice(["Tops", "Jeans", "Shoes", "Accessories"], n_products),
+        "name": [f"Product {i}" for i in range(1, n_products + 1)],
+        "brand": rng.choice(["BrandA", "BrandB", "BrandC"], n_products),
+        "retail_price": rng.uniform(10, 150, n_products).round(2),
+        "department": rng.choice(["Men", "Women"], n_products),
+        "sku": [f"SKU{i}" for i in range(1, n_products + 1)],
+        "distribution_center_id": rng.integers(1, 10, n_products),
+    })
+
+    # Orders: Poisson per user, after signup
+    per_user = rng.poisson(2.5, n_users)
+    o_user = np.repeat(user_ids, per_user)
+    n_orders = len(o_user)
+    o_created = _random_times(rng, np.repeat(user_created, per_user), np.full(n_orders, END, dtype="datetime64[s]"))
+    status = rng.choice(["Complete", "Shipped", "Processing", "Cancelled", "Returned"], n_orders,
+                        p=[0.45, 0.25, 0.15, 0.1, 0.05])
+    n_items = rng.integers(1, 4, n_orders)
+    orders = pd.DataFrame({
+        "order_id": np.arange(1, n_orders + 1), "user_id": o_user, "status": status,
+        "gender": users["gender"].to_numpy()[o_user - 1],
+        "created_at": o_created, "returned_at": pd.NaT,
+        "shipped_at": o_created + np.timedelta64(1, "D"), "delivered_at": o_created + np.timedelta64(3, "D"),
+        "num_of_item": n_items,
+    })
+    i_order = np.repeat(np.arange(1, n_orders + 1), n_items)
+    n_order_items = len(i_order)
+    order_items = pd.DataFrame({
+        "id": np.arange(1, n_order_items + 1), "order_id": i_order, "user_id": o_user[i_order - 1],
+        "product_id": rng.integers(1, n_products + 1, n_order_items),
+        "inventory_item_id": np.arange(1, n_order_items + 1), "status": status[i_order - 1],
+        "created_at": o_created[i_order - 1], "shipped_at": pd.NaT, "delivered_at": pd.NaT, "returned_at": pd.NaT,
+        "sale_price": rng.uniform(10, 150, n_order_items).round(2),
+    })
+
+    # Sessions -> events: a home/product/cart/purchase funnel with drop-off
+    sessions_per_user = rng.poisson(6, n_users) + 1
+    s_user = np.repeat(user_ids, sessions_per_user)
+    n_sessions = len(s_user)
+    s_start = _random_times(rng, np.repeat(user_created, sessions_per_user), np.full(n_sessions, END, dtype="datetime64[s]"))
+    depth = 1 + (rng.random(n_sessions) < 0.8) + (rng.random(n_sessions) < 0.35) + (rng.random(n_sessions) < 0.15)
+    views = rng.poisson(2, n_sessions)
+    events_per_session = depth + views
+    e_session = np.repeat(np.arange(n_sessions), events_per_session)
+    n_events = len(e_session)
+    seq = np.arange(n_events) - np.repeat(np.cumsum(events_per_session) - events_per_session, events_per_session)
+    funnel = np.array(["home", "product", "cart", "purchase"])
+    # Extra product views sit between the first product view and the cart step
+    step = np.minimum(seq, 1) + np.maximum(seq - views[e_session] - 1, 0)
+    step = np.minimum(step, depth[e_session] - 1)
+    events = pd.DataFrame({
+        "id": np.arange(1, n_events + 1), "user_id": s_user[e_session], "sequence_number": seq + 1,
+        "session_id": np.char.add("s", e_session.astype(str)),
+        "created_at": s_start[e_session] + (seq * 45).astype("timedelta64[s]"),
+        "ip_address": "10.0.0.1", "city": "Bench City",
+        "state": users["state"].to_numpy()[s_user[e_session] - 1], "postal_code": "00000",
+        "browser": rng.choice(["Chrome", "Safari", "Firefox", "Edge"], n_events, p=[0.5, 0.25, 0.15, 0.1]),
+        "traffic_source": users["traffic_source"].to_numpy()[s_user[e_session] - 1],
+        "uri": "/", "event_type": funnel[step],
+    })
+
+    tables = {"users": users, "products": products, "orders": orders, "order_items": order_items, "events": events}
+    for name, df in tables.items():
+        df.to_csv(os.path.join(out_dir, f"{name}.csv"), index=False)
+    return {name: len(df) for name, df in tables.items()}
+
+
+def ensure_database():
+    admin = create_engine(db_url(db_name), isolation_level="AUTOCOMMIT")
+    with admin.connect() as conn:
+        exists = conn.execute(text("SELECT 1 FROM pg_database WHERE datname = :db"), {"db": BENCH_DB}).scalar()
+        if not exists:
+            conn.execute(text(f'CREATE DATABASE "{BENCH_DB}"'))
+    admin.dispose()
+
+
+def db_active_seconds(conn):
+    # Backends flush their stats when they exit, which each stage's processes do before we read
+    conn.execute(text("SELECT pg_stat_clear_snapshot()"))
+    ms = conn.execute(text("SELECT active_time FROM pg_stat_database WHERE datname = :db"), {"db": BENCH_DB}).scalar()
+    return (ms or 0.0) / 1000
+
+
+def count_rows(conn, query):
+    try:
+        return int(conn.execute(text(query)).scalar() or 0)
+    except Exception:
+        conn.rollback()
+        return None
+
+
+def run_scale(scale, run_id, engine):
+    data_dir = os.path.join(WORK_DIR, f"sf{scale}")
+    print(f"\n=== scale factor {scale}: generating data in {data_dir} ===", flush=True)
+    rows = generate_dataset(float(scale), data_dir)
+    print(f"Generated {rows}", flush=True)
+
+    stage_dir = os.path.join(WORK_DIR, run_id, f"sf{scale}")
+    os.makedirs(os.path.join(stage_dir, "reports"), exist_ok=True)
+    env = dict(
+        os.environ,
+        POSTGRES_DB=BENCH_DB,
+        DATA_DIR=data_dir,
+        MLFLOW_TRACKING_URI=f"file:{os.path.join(stage_dir, 'mlruns')}",
+        SNAPSHOT_CACHE_DIR=os.path.join(stage_dir, "snapshots"),
+        PYTHONPATH=REPO_ROOT,
+    )
+    results = {}
+    for stage in STAGES:
+        with engine.connect() as conn:
+            active_before = db_active_seconds(conn)
+        # Run from the per-run directory so relative outputs (reports/, plots) land there
+        result = run_command(stage["cmd"], os.path.join(stage_dir, "logs", f"{stage['name']}.log"), cwd=stage_dir, env=env)
+        with engine.connect() as conn:
+            result["query_s"] = round(db_active_seconds(conn) - active_before, 3)
+            result["rows"] = count_rows(conn, stage["rows"])
+        result["rows_per_s"] = round(result["rows"] / result["wall_s"], 1) if result["rows"] and result["wall_s"] else None
+        result["status"] = "success" if result["returncode"] == 0 else "failed"
+        results[stage["name"]] = result
+        print(f"[sf{scale}] {stage['name']:15s} {result['status']:7s} wall={result['wall_s']:8.2f}s "
+              f"query={result['query_s']:8.2f}s rss={result['peak_rss_mb']:8.1f}MB rows={result['rows']} "
+              f"({result['rows_per_s']} rows/s)", flush=True)
+        if result["status"] != "success":
+            print(f"Stopping scale {scale}: see {stage_dir}/logs/{stage['name']}.log")
+            break
+    return {"generated_rows": rows, "stages": results}
+
+
+def find_regressions(record, baseline, tolerance):
+    flags = []
+    for scale, res in record["scales"].items():
+        base = (baseline or {}).get("scales", {}).get(scale, {}).get("stages", {})
+        for name, cur in res["stages"].items():
+            ref = base.get(name)
+            if cur["status"] != "success":
+                flags.append({"scale": scale, "stage": name, "kind": "failed"})
+            if not ref or ref.get("status") != "success" or cur["status"] != "success":
+                continue
+            for metric, min_abs in (("wall_s", MIN_FLAG_SECONDS), ("query_s", MIN_FLAG_SECONDS), ("peak_rss_mb", 50.0)):
+                if ref.get(metric) and cur[metric] > ref[metric] * (1 + tolerance) and cur[metric] - ref[metric] > min_abs:
+                    flags.append({"scale": scale, "stage": name, "kind": f"{metric}_regression",
+                                  "baseline": ref[metric], "current": cur[metric]})
+
+    # Scaling cliffs within this run
+    scales = sorted(record["scales"], key=float)
+    for lo, hi in zip(scales, scales[1:]):
+        for name, cur in record["scales"][hi]["stages"].items():
+            prev = record["scales"][lo]["stages"].get(name)
+            if not prev or prev["status"] != "success" or cur["status"] != "success":
+                continue
+            if prev["wall_s"] > 0 and cur["wall_s"] > 5 * MIN_FLAG_SECONDS:
+                exponent = math.log(cur["wall_s"] / prev["wall_s"]) / math.log(float(hi) / float(lo))
+                if exponent > SUPERLINEAR_EXPONENT:
+                    flags.append({"scale": hi, "stage": name, "kind": "superlinear_scaling",
+                                  "from_scale": lo, "exponent": round(exponent, 2)})
+    return flags
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", nargs="+", type=float, default=[0.1, 1.0])
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown vs the baseline")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    args = parser.parse_args()
+
+    run_id = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S") + "-" + uuid.uuid4().hex[:6]
+    ensure_database()
+    engine = create_engine(db_url(BENCH_DB))
+    record = {
+        "run_id": run_id,
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "git_revision": git_revision(),
+        "scales": {},
+    }
+    for scale in sorted(args.scales):
+        record["scales"][f"{scale:g}"] = run_scale(f"{scale:g}", run_id, engine)
+
+    baseline = None
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as f:
+            baseline = json.load(f)
+    record["regressions"] = find_regressions(record, baseline, args.tolerance)
+    record["baseline_run_id"] = baseline["run_id"] if baseline else None
+
+    os.makedirs(os.path.dirname(HISTORY_PATH), exist_ok=True)
+    with open(HISTORY_PATH, "a") as f:
+        f.write(json.dumps(record) + "\n")
+    if args.save_baseline:
+        with open(BASELINE_PATH, "w") as f:
+            json.dump(record, f, indent=2)
+        print(f"Baseline saved to {os.path.relpath(BASELINE_PATH, REPO_ROOT)}")
+
+    if record["regressions"]:
+        print("\nREGRESSIONS:")
+        for flag in record["regressions"]:
+            print(f"  {flag}")
+    else:
+        print("\nNo regressions" + ("" if baseline else " (no baseline yet; run with --save-baseline)"))
+    print(f"Run {run_id} appended to {os.path.relpath(HISTORY_PATH, REPO_ROOT)}")
+    sys.exit(1 if record["regressions"] and not args.save_baseline else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -13,7 +13,20 @@ DB_NAME = os.getenv('POSTGRES_DB', 'ecom')
 DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
 engine = create_engine(DATABASE_URL)
 
-DATA_DIR = "/usr/src/app/data"
+DATA_DIR = os.getenv("DATA_DIR", "/usr/src/app/data")
+
+# Time-series tables are range-partitioned by month on created_at so the windowed
+# mart filters (created_at < snapshot, 30/60-day windows) prune partitions.
+PARTITIONED_TABLES = {'events', 'orders', 'order_items'}
+PARTITION_KEY = 'created_at'
+
+# Built after the bulk load (cheaper than maintaining them row by row)
+INDEXES = {
+    'events': ['user_id', 'session_id'],
+    'orders': ['user_id', 'order_id'],
+    'order_items': ['user_id', 'order_id'],
+    'users': ['id'],
+}
 
 def create_schema(schema_name):
     with engine.connect() as conn:
@@ -21,30 +34,85 @@ def create_schema(schema_name):
         conn.commit()
     print(f"Schema {schema_name} created/verified.")
 
+def create_partitioned_table(df, table_name, schema="raw"):
+    # Same column types pandas.to_sql would pick, plus a monthly RANGE partition key
+    ddl = pd.io.sql.get_schema(df, table_name, con=engine, schema=schema).rstrip().rstrip(';')
+    with engine.connect() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {schema}.{table_name} CASCADE;"))
+        conn.execute(text(f"{ddl} PARTITION BY RANGE ({PARTITION_KEY});"))
+        # Rows without a created_at land here instead of failing the load
+        conn.execute(text(f"CREATE TABLE {schema}.{table_name}_default PARTITION OF {schema}.{table_name} DEFAULT;"))
+        conn.commit()
+
+def ensure_month_partitions(df, table_name, created, schema="raw"):
+    months = df[PARTITION_KEY].dropna().dt.to_period('M').unique()
+    new_months = [m for m in months if m not in created]
+    if not new_months:
+        return
+    with engine.connect() as conn:
+        for month in sorted(new_months):
+            start = month.start_time.strftime('%Y-%m-%d')
+            end = (month + 1).start_time.strftime('%Y-%m-%d')
+            conn.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {schema}.{table_name}_p{month.strftime('%Y_%m')} "
+                f"PARTITION OF {schema}.{table_name} FOR VALUES FROM ('{start}') TO ('{end}');"
+            ))
+            created.add(month)
+        conn.commit()
+
+def parse_timestamps(series):
+    """Vectorized ISO-8601 parse to naive UTC; BigQuery CSV exports append a ' UTC' suffix."""
+    if series.dtype == object:
+        series = series.str.removesuffix(' UTC')
+    return pd.to_datetime(series, utc=True, errors='coerce', format='ISO8601').dt.tz_localize(None)
+
+def write_chunk(chunk, table_name, first, created, schema="raw"):
+    """Write one DataFrame chunk; the first chunk (re)creates the table."""
+    if table_name not in PARTITIONED_TABLES:
+        chunk.to_sql(table_name, engine, schema=schema, if_exists='replace' if first else 'append', index=False, chunksize=10000)
+        return
+    # Naive UTC timestamps keep staging's created_at::timestamp cast a no-op, so the planner can prune
+    chunk[PARTITION_KEY] = parse_timestamps(chunk[PARTITION_KEY])
+    if first:
+        create_partitioned_table(chunk, table_name, schema)
+    ensure_month_partitions(chunk, table_name, created, schema)
+    chunk.to_sql(table_name, engine, schema=schema, if_exists='append', index=False, chunksize=10000)
+
+def finalize_tables(table_names, schema="raw"):
+    """Build post-load indexes and refresh planner statistics."""
+    with engine.connect() as conn:
+        for table_name in table_names:
+            for column in INDEXES.get(table_name, []):
+                print(f"Indexing {schema}.{table_name}({column})...", flush=True)
+                conn.execute(text(f"CREATE INDEX IF NOT EXISTS {table_name}_{column}_idx ON {schema}.{table_name} ({column});"))
+            conn.commit()
+        for table_name in table_names:
+            conn.execute(text(f"ANALYZE {schema}.{table_name};"))
+        conn.commit()
+    print(f"Indexes built and statistics refreshed for: {', '.join(table_names)}", flush=True)
+
 def load_csv_to_postgres(file_path, table_name, schema="raw"):
     print(f"Loading {file_path} into {schema}.{table_name}...", flush=True)
     try:
         # Read CSV in chunks to avoid memory issues and enable progress logging
         chunksize = 100000
         count = 0
+        created_partitions = set()
         for chunk in pd.read_csv(file_path, chunksize=chunksize):
             # Clean column names
             chunk.columns = [c.lower().replace(' ', '_') for c in chunk.columns]
             
-            # Write to Postgres
-            if count == 0:
-                # Replace on first chunk
-                chunk.to_sql(table_name, engine, schema=schema, if_exists='replace', index=False, chunksize=10000)
-            else:
-                # Append on subsequent chunks
-                chunk.to_sql(table_name, engine, schema=schema, if_exists='append', index=False, chunksize=10000)
+            # Write to Postgres (replace on first chunk, append on subsequent chunks)
+            write_chunk(chunk, table_name, count == 0, created_partitions, schema)
             
             count += len(chunk)
             print(f"Loaded {count} rows...", flush=True)
             
         print(f"Successfully loaded {count} rows to {table_name}", flush=True)
+        return True
     except Exception as e:
         print(f"Error loading {table_name}: {e}", flush=True)
+        return False
 
 def generate_mock_data(engine):
     print("Generating mock data for TheLook schema...")
@@ -96,7 +164,7 @@ def generate_mock_data(engine):
         'delivered_at': pd.to_datetime('2023-01-04'),
         'num_of_item': [1] * 50
     })
-    df_orders.to_sql('orders', engine, schema='raw', if_exists='replace', index=False)
+    write_chunk(df_orders, 'orders', True, set())
     
     # Mock Order Items
     df_order_items = pd.DataFrame({
@@ -112,7 +180,7 @@ def generate_mock_data(engine):
         'returned_at': None,
         'sale_price': [20.0] * 50
     })
-    df_order_items.to_sql('order_items', engine, schema='raw', if_exists='replace', index=False)
+    write_chunk(df_order_items, 'order_items', True, set())
 
     # Mock Events
     df_events = pd.DataFrame({
@@ -130,7 +198,7 @@ def generate_mock_data(engine):
         'uri': ['/home'] * 100,
         'event_type': ['home'] * 100
     })
-    df_events.to_sql('events', engine, schema='raw', if_exists='replace', index=False)
+    write_chunk(df_events, 'events', True, set())
 
     # Mock Inventory Items
     df_inventory = pd.DataFrame({
@@ -156,9 +224,11 @@ def main():
     
     # DROP dependent schemas to allow replacing raw tables
     with engine.connect() as conn:
-        print("Dropping dependent schemas (staging, marts) to release locks...", flush=True)
+        print("Dropping dependent schemas (staging, intermediate, marts) to release locks...", flush=True)
         conn.execute(text("DROP SCHEMA IF EXISTS public_staging CASCADE;"))
         conn.execute(text("DROP SCHEMA IF EXISTS public_marts CASCADE;"))
+        # Incremental rollups must be rebuilt from the reloaded raw tables
+        conn.execute(text("DROP SCHEMA IF EXISTS public_intermediate CASCADE;"))
         conn.commit()
     
     # Wait for DB? (Docker depends_on handles mostly, but good to be safe)
@@ -175,12 +245,17 @@ def main():
         # Also create hello world for Sprint 1 check
         df_dummy = pd.DataFrame({'id': [1, 2], 'message': ['Hello', 'World']})
         df_dummy.to_sql('hello_world', engine, schema='raw', if_exists='replace', index=False)
+        finalize_tables(['users', 'orders', 'order_items', 'events'])
         return
 
+    loaded_tables = []
     for file_path in csv_files:
         file_name = os.path.basename(file_path)
         table_name = os.path.splitext(file_name)[0]
-        load_csv_to_postgres(file_path, table_name)
+        if load_csv_to_postgres(file_path, table_name):
+            loaded_tables.append(table_name)
+
+    finalize_tables(loaded_tables)
 
 if __name__ == "__main__":
     main()
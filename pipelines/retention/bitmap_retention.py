@@ -0,0 +1,256 @@
+"""Incremental weekly cohort retention over packed user-id bitmaps.
+
+State (in RETENTION_STATE_DIR, default .cache/retention_bitmaps/):
+  * activity.npy   - one packed bitmap per activity week (bit = user_id),
+  * cohort.npy     - one packed bitmap per cohort week (users first seen that week),
+  * first_week.npy - cohort week index per user_id (-1 = never seen),
+  * state.json     - base week, week count and the fct_sessions watermark.
+
+A cell of the cohort x period matrix is popcount(cohort[c] & activity[w]),
+computed one activity week at a time against every cohort with NumPy. A normal
+run re-reads only the newest stored week onward from fct_sessions, plus any
+re-processed older sessions that add a (user, week) pair not already in the
+bitmaps. Only the cells of those activity weeks are recomputed and replaced in
+analytics.mart_retention, which has the same columns as the dbt mart_retention.
+A change that moves a user into an earlier cohort triggers a full rebuild.
+
+Usage:
+    python pipelines/retention/bitmap_retention.py [--full-refresh]
+"""
+import argparse
+import json
+import os
+import time
+from datetime import date, timedelta
+
+import numpy as np
+from sqlalchemy import create_engine, text
+
+# Database Connection
+db_user = os.getenv('POSTGRES_USER', 'user')
+db_pass = os.getenv('POSTGRES_PASSWORD', 'password')
+db_host = os.getenv('POSTGRES_HOST', 'postgres')
+db_port = os.getenv('POSTGRES_PORT', '5432')
+db_name = os.getenv('POSTGRES_DB', 'ecom')
+
+connection_str = f"postgresql+psycopg2://{db_user}:{db_pass}@{db_host}:{db_port}/{db_name}"
+engine = create_engine(connection_str)
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+STATE_DIR = os.getenv("RETENTION_STATE_DIR", os.path.join(REPO_ROOT, ".cache", "retention_bitmaps"))
+SOURCE_TABLE = "public_marts.fct_sessions"
+TARGET_TABLE = "analytics.mart_retention"
+
+# Set bits per byte value
+POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def popcount(bits):
+    """Number of set bits per row of a packed uint8 bitmap array."""
+    return POPCOUNT[bits].sum(axis=-1, dtype=np.int64)
+
+
+def set_bits(bitmaps, rows, user_ids):
+    np.bitwise_or.at(bitmaps, (rows, user_ids >> 3), (128 >> (user_ids & 7)).astype(np.uint8))
+
+
+def bits_set(bitmaps, rows, user_ids):
+    return (bitmaps[rows, user_ids >> 3] & (128 >> (user_ids & 7)).astype(np.uint8)) != 0
+
+
+def grow(array, n_rows, n_cols, fill=0):
+    """Pad a 1-D or 2-D state array up to the given size."""
+    if array.ndim == 1:
+        if array.shape[0] >= n_cols:
+            return array
+        return np.concatenate([array, np.full(n_cols - array.shape[0], fill, dtype=array.dtype)])
+    out = np.full((max(n_rows, array.shape[0]), max(n_cols, array.shape[1])), fill, dtype=array.dtype)
+    out[:array.shape[0], :array.shape[1]] = array
+    return out
+
+
+def source_bounds():
+    with engine.connect() as conn:
+        row = conn.execute(text(f"""
+            SELECT date_trunc('week', min(session_start_at))::date, max(dbt_updated_at)::text, max(user_id)
+            FROM {SOURCE_TABLE}
+        """)).fetchone()
+    return row[0], row[1], row[2]
+
+
+def fetch_pairs(base_week, where="", params=None):
+    """Distinct (user_id, week index) pairs from fct_sessions."""
+    query = text(f"""
+        SELECT DISTINCT user_id, (date_trunc('week', session_start_at)::date - :base_week) / 7 AS week_idx
+        FROM {SOURCE_TABLE}
+        WHERE user_id IS NOT NULL {where}
+    """)
+    with engine.connect() as conn:
+        rows = conn.execute(query, {"base_week": base_week, **(params or {})}).fetchall()
+    pairs = np.array(rows, dtype=np.int64).reshape(-1, 2)
+    return pairs[:, 0], pairs[:, 1]
+
+
+def load_state():
+    path = os.path.join(STATE_DIR, "state.json")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        state = json.load(f)
+    state["base_week"] = date.fromisoformat(state["base_week"])
+    for name in ("activity", "cohort", "first_week"):
+        state[name] = np.load(os.path.join(STATE_DIR, f"{name}.npy"))
+    return state
+
+
+def save_state(state):
+    os.makedirs(STATE_DIR, exist_ok=True)
+    for name in ("activity", "cohort", "first_week"):
+        np.save(os.path.join(STATE_DIR, f"{name}.npy"), state[name])
+    meta = {"base_week": state["base_week"].isoformat(), "n_weeks": state["n_weeks"], "watermark": state["watermark"]}
+    with open(os.path.join(STATE_DIR, "state.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+
+
+def full_build(base_week, watermark, max_user_id):
+    n_bytes = int(max_user_id) // 8 + 1
+    user_ids, weeks = fetch_pairs(base_week)
+    n_weeks = int(weeks.max()) + 1 if weeks.size else 0
+    activity = np.zeros((n_weeks, n_bytes), dtype=np.uint8)
+    set_bits(activity, weeks, user_ids)
+
+    first_week = np.full(n_bytes * 8, np.iinfo(np.int32).max, dtype=np.int32)
+    np.minimum.at(first_week, user_ids, weeks.astype(np.int32))
+    first_week[first_week == np.iinfo(np.int32).max] = -1
+    seen = np.flatnonzero(first_week >= 0)
+    cohort = np.zeros_like(activity)
+    set_bits(cohort, first_week[seen], seen)
+
+    state = {"base_week": base_week, "n_weeks": n_weeks, "watermark": watermark,
+             "activity": activity, "cohort": cohort, "first_week": first_week}
+    return state, list(range(n_weeks))
+
+
+def incremental_update(state, watermark, max_user_id):
+    """Apply sessions changed since the last run; returns the activity weeks to recompute, or None for a rebuild."""
+    base_week = state["base_week"]
+    since_idx = max(state["n_weeks"] - 1, 0)
+    since = base_week + timedelta(weeks=since_idx)
+
+    # Older weeks: only sessions re-processed since the watermark, and only pairs we haven't seen
+    old_users, old_weeks = fetch_pairs(base_week, "AND dbt_updated_at > :watermark AND session_start_at < :since",
+                                       {"watermark": state["watermark"], "since": since})
+    new_users, new_weeks = fetch_pairs(base_week, "AND session_start_at >= :since", {"since": since})
+
+    n_weeks = max([state["n_weeks"], int(new_weeks.max()) + 1 if new_weeks.size else 0])
+    n_bytes = int(max_user_id) // 8 + 1
+    activity = grow(state["activity"], n_weeks, n_bytes)
+    cohort = grow(state["cohort"], n_weeks, n_bytes)
+    first_week = grow(state["first_week"], 0, n_bytes * 8, fill=-1)
+
+    fresh = ~bits_set(activity, old_weeks, old_users)
+    old_users, old_weeks = old_users[fresh], old_weeks[fresh]
+    known = first_week[old_users]
+    if np.any((known < 0) | (old_weeks < known)):
+        print("Re-processed sessions move users into earlier cohorts; rebuilding.")
+        return None
+    set_bits(activity, old_weeks, old_users)
+
+    # Newest stored week onward is rebuilt from scratch (it was possibly partial)
+    activity[since_idx:] = 0
+    cohort[since_idx:] = 0
+    set_bits(activity, new_weeks, new_users)
+    first_week[first_week >= since_idx] = -1
+    candidates = first_week[new_users] < 0
+    cand_users, cand_weeks = new_users[candidates], new_weeks[candidates].astype(np.int32)
+    first = np.full(first_week.shape[0], np.iinfo(np.int32).max, dtype=np.int32)
+    np.minimum.at(first, cand_users, cand_weeks)
+    newly_seen = np.flatnonzero(first != np.iinfo(np.int32).max)
+    first_week[newly_seen] = first[newly_seen]
+    set_bits(cohort, first_week[newly_seen], newly_seen)
+
+    state.update(n_weeks=n_weeks, watermark=watermark, activity=activity, cohort=cohort, first_week=first_week)
+    return sorted(set(range(since_idx, n_weeks)) | set(old_weeks.tolist()))
+
+
+def retention_cells(state, weeks):
+    """mart_retention rows for every (cohort, period) whose activity week is in ``weeks``."""
+    base_week = state["base_week"]
+    cohort, activity = state["cohort"], state["activity"]
+    initial_users = popcount(cohort)
+    records = []
+    for w in weeks:
+        # One vectorized AND + popcount of this week's bitmap against all earlier cohorts
+        active = popcount(cohort[:w + 1] & activity[w])
+        for c in np.flatnonzero(active):
+            records.append({
+                "cohort_week": base_week + timedelta(weeks=int(c)),
+                "period_number": int(w - c),
+                "initial_users": int(initial_users[c]),
+                "active_users": int(active[c]),
+                "retention_rate": float(active[c] / initial_users[c]),
+                "source_updated_at": state["watermark"],
+            })
+    return records
+
+
+def write_cells(records, weeks, base_week, full):
+    with engine.begin() as conn:
+        conn.execute(text("CREATE SCHEMA IF NOT EXISTS analytics"))
+        conn.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {TARGET_TABLE} (
+                cohort_week date NOT NULL,
+                period_number integer NOT NULL,
+                initial_users bigint,
+                active_users bigint,
+                retention_rate numeric,
+                source_updated_at timestamp,
+                PRIMARY KEY (cohort_week, period_number)
+            )
+        """))
+        if full:
+            conn.execute(text(f"TRUNCATE {TARGET_TABLE}"))
+        elif weeks:
+            activity_weeks = [base_week + timedelta(weeks=w) for w in weeks]
+            conn.execute(text(f"DELETE FROM {TARGET_TABLE} WHERE cohort_week + period_number * 7 = ANY(:weeks)"),
+                         {"weeks": activity_weeks})
+        if records:
+            conn.execute(text(f"""
+                INSERT INTO {TARGET_TABLE} (cohort_week, period_number, initial_users, active_users, retention_rate, source_updated_at)
+                VALUES (:cohort_week, :period_number, :initial_users, :active_users, :retention_rate, CAST(:source_updated_at AS timestamp))
+            """), records)
+
+
+def run(full_refresh=False):
+    start = time.perf_counter()
+    base_week, watermark, max_user_id = source_bounds()
+    if base_week is None:
+        print(f"{SOURCE_TABLE} is empty; nothing to do.")
+        return
+
+    state = None if full_refresh else load_state()
+    if state is not None and base_week < state["base_week"]:
+        print("Sessions before the stored base week; rebuilding.")
+        state = None
+    if state is not None and state["watermark"] == watermark:
+        print(f"No sessions updated since {watermark}; retention is current.")
+        return
+
+    weeks = incremental_update(state, watermark, max_user_id) if state is not None else None
+    full = weeks is None
+    if full:
+        state, weeks = full_build(base_week, watermark, max_user_id)
+
+    records = retention_cells(state, weeks)
+    write_cells(records, weeks, state["base_week"], full)
+    save_state(state)
+    kind = "full build" if full else "incremental"
+    print(f"Retention {kind}: {len(weeks)} activity week(s), {len(records)} cells written to {TARGET_TABLE} "
+          f"in {time.perf_counter() - start:.2f}s (bitmaps: {state['n_weeks']} weeks x {state['activity'].shape[1]} bytes)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bitmap-based incremental cohort retention")
+    parser.add_argument("--full-refresh", action="store_true", help="rebuild all bitmaps and cells")
+    args = parser.parse_args()
+    run(full_refresh=args.full_refresh)
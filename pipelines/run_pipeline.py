@@ -0,0 +1,288 @@
+"""Dependency-aware runner for the end-to-end pipeline.
+
+Runs load -> dbt -> quality checks -> training -> scoring / drift as one DAG:
+stages whose dependencies are satisfied run in parallel (e.g. baseline and
+advanced training, or batch scoring and the drift report), and a stage is
+skipped when its inputs - file checksums, Postgres table fingerprints and the
+latest registered model version - match its last successful run.
+
+Every run appends per-stage status, wall time, CPU time and peak RSS to
+reports/pipeline_history.jsonl; stage output goes to reports/pipeline_logs/<run_id>/.
+
+Usage:
+    python pipelines/run_pipeline.py [--stages train_advanced batch_score] [--force] [--workers 3]
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime, timezone
+
+from sqlalchemy import create_engine, text
+
+# Database Connection
+db_user = os.getenv('POSTGRES_USER', 'user')
+db_pass = os.getenv('POSTGRES_PASSWORD', 'password')
+db_host = os.getenv('POSTGRES_HOST', 'postgres')
+db_port = os.getenv('POSTGRES_PORT', '5432')
+db_name = os.getenv('POSTGRES_DB', 'ecom')
+
+connection_str = f"postgresql+psycopg2://{db_user}:{db_pass}@{db_host}:{db_port}/{db_name}"
+engine = create_engine(connection_str)
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATE_PATH = os.path.join(REPO_ROOT, "reports", "pipeline_state.json")
+HISTORY_PATH = os.path.join(REPO_ROOT, "reports", "pipeline_history.jsonl")
+LOG_DIR = os.path.join(REPO_ROOT, "reports", "pipeline_logs")
+
+RAW_TABLES = ["raw.users", "raw.orders", "raw.order_items", "raw.events", "raw.products"]
+TRAINING_TABLES = ["public_marts.churn_features", "public_marts.churn_labels"]
+
+# name -> command, upstream stages and the inputs that decide whether it must re-run
+STAGES = {
+    "load": {
+        "cmd": ["python", "pipelines/extract_load/load_data.py"],
+        "deps": [],
+        "files": ["pipelines/extract_load/load_data.py", "data/*.csv"],
+        "tables": [],
+    },
+    "dbt": {
+        "cmd": ["bash", "-c", "cd dbt && dbt build --profiles-dir ."],
+        "deps": ["load"],
+        "files": ["dbt/dbt_project.yml", "dbt/models/**/*.sql", "dbt/models/**/*.yml"],
+        "tables": RAW_TABLES,
+    },
+    "retention": {
+        "cmd": ["python", "pipelines/retention/bitmap_retention.py"],
+        "deps": ["dbt"],
+        "files": ["pipelines/retention/bitmap_retention.py"],
+        "tables": ["public_marts.fct_sessions"],
+    },
+    "ge_checks": {
+        "cmd": ["python", "quality/run_ge_checks.py"],
+        "deps": ["dbt"],
+        "files": ["quality/run_ge_checks.py"],
+        "tables": ["raw.users", "public_marts.churn_features"],
+    },
+    "train_baseline": {
+        "cmd": ["python", "ml/training/train_baseline.py"],
+        "deps": ["ge_checks"],
+        "files": ["ml/training/train_baseline.py", "ml/snapshot_cache.py"],
+        "tables": TRAINING_TABLES,
+    },
+    "train_advanced": {
+        "cmd": ["python", "ml/training/train_advanced.py"],
+        "deps": ["ge_checks"],
+        "files": ["ml/training/train_advanced.py", "ml/snapshot_cache.py", "ml/feature_spec.py", "ml/monitoring/sketches.py"],
+        "tables": TRAINING_TABLES,
+    },
+    "distill": {
+        "cmd": ["python", "ml/training/distill_model.py"],
+        "deps": ["train_advanced"],
+        "files": ["ml/training/distill_model.py", "ml/snapshot_cache.py", "ml/feature_spec.py", "ml/monitoring/sketches.py"],
+        "tables": TRAINING_TABLES,
+        "models": ["churn_prediction_advanced"],
+    },
+    "batch_score": {
+        "cmd": ["python", "ml/inference/batch_score.py"],
+        "deps": ["train_advanced"],
+        "files": ["ml/inference/batch_score.py", "ml/feature_spec.py"],
+        "tables": ["public_marts.churn_scoring"],
+        "models": ["churn_prediction_advanced"],
+    },
+    "drift_report": {
+        "cmd": ["python", "ml/monitoring/drift_report.py"],
+        "deps": ["ge_checks"],
+        "files": ["ml/monitoring/drift_report.py", "ml/monitoring/drift_metrics.py"],
+        "tables": ["public_marts.churn_features", "public_marts.churn_scoring"],
+    },
+}
+
+
+def file_checksums(patterns):
+    digest = hashlib.sha256()
+    for pattern in patterns:
+        for path in sorted(glob.glob(os.path.join(REPO_ROOT, pattern), recursive=True)):
+            digest.update(os.path.relpath(path, REPO_ROOT).encode())
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+    return digest.hexdigest()
+
+
+def table_fingerprints(tables):
+    # Per leaf partition (a plain table is its own leaf): oid + relfilenode change when a table is
+    # rebuilt, reloaded or truncated, and the size grows with appends. Row count + newest writing
+    # transaction id catch in-place incremental updates. pg_stat_user_tables counters are not
+    # used: they lag (asynchronous), reset with pg_stat_reset and stay zero on partitioned parents.
+    storage = text("""
+        SELECT c.oid, c.relfilenode, pg_relation_size(c.oid)
+        FROM pg_partition_tree(to_regclass(:relation)) t
+        JOIN pg_class c ON c.oid = t.relid
+        WHERE t.isleaf
+        ORDER BY c.oid
+    """)
+    fingerprints = {}
+    with engine.connect() as conn:
+        for relation in tables:
+            leaves = [list(row) for row in conn.execute(storage, {"relation": relation})]
+            if not leaves:
+                fingerprints[relation] = None
+                continue
+            row = conn.execute(text(f"SELECT count(*), max(xmin::text::bigint) FROM {relation}")).fetchone()
+            fingerprints[relation] = {"leaves": leaves, "rows": row[0], "max_xmin": row[1]}
+    return fingerprints
+
+
+def model_versions(models):
+    if not models:
+        return {}
+    try:
+        import mlflow
+
+        mlflow.set_tracking_uri(os.getenv("MLFLOW_TRACKING_URI", "http://mlflow:5001"))
+        client = mlflow.MlflowClient()
+        return {m: max(int(v.version) for v in client.search_model_versions(f"name='{m}'")) for m in models}
+    except Exception as e:
+        print(f"Could not resolve model versions ({e}); treating as changed.")
+        return {m: uuid.uuid4().hex for m in models}
+
+
+def stage_fingerprint(stage):
+    inputs = {
+        "cmd": stage["cmd"],
+        "files": file_checksums(stage["files"]),
+        "tables": table_fingerprints(stage["tables"]),
+        "models": model_versions(stage.get("models", [])),
+    }
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def run_command(cmd, log_path, cwd=REPO_ROOT, env=None):
+    """Run ``cmd`` (from the repo root by default); return exit code, wall/CPU time and peak RSS of its process tree."""
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    with open(log_path, "w") as log:
+        start = time.perf_counter()
+        proc = subprocess.Popen(cmd, cwd=cwd, env=env, stdout=log, stderr=subprocess.STDOUT)
+        # wait4 returns the rusage of this specific child (and its reaped descendants)
+        _, status, usage = os.wait4(proc.pid, 0)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+        wall = time.perf_counter() - start
+    return {
+        "returncode": proc.returncode,
+        "wall_s": round(wall, 3),
+        "cpu_s": round(usage.ru_utime + usage.ru_stime, 3),
+        "peak_rss_mb": round(usage.ru_maxrss / 1024, 1),  # ru_maxrss is in KiB on Linux
+    }
+
+
+def load_state():
+    if not os.path.exists(STATE_PATH):
+        return {}
+    with open(STATE_PATH) as f:
+        return json.load(f)
+
+
+def save_state(state):
+    os.makedirs(os.path.dirname(STATE_PATH), exist_ok=True)
+    with open(STATE_PATH, "w") as f:
+        json.dump(state, f, indent=2)
+
+
+def selected_stages(names):
+    """Requested stages plus everything upstream of them, in the STAGES order."""
+    if not names:
+        return list(STAGES)
+    needed = set()
+    stack = list(names)
+    while stack:
+        name = stack.pop()
+        if name not in STAGES:
+            raise SystemExit(f"Unknown stage: {name}. Choose from {', '.join(STAGES)}")
+        if name not in needed:
+            needed.add(name)
+            stack.extend(STAGES[name]["deps"])
+    return [s for s in STAGES if s in needed]
+
+
+def execute_stage(name, run_id, state, force):
+    stage = STAGES[name]
+    fingerprint = stage_fingerprint(stage)
+    if not force and state.get(name) == fingerprint:
+        return {"status": "skipped", "fingerprint": fingerprint}
+    print(f"[{name}] running: {' '.join(stage['cmd'])}", flush=True)
+    result = run_command(stage["cmd"], os.path.join(LOG_DIR, run_id, f"{name}.log"))
+    result["status"] = "success" if result["returncode"] == 0 else "failed"
+    result["fingerprint"] = fingerprint
+    return result
+
+
+def run_pipeline(stage_names=None, force=False, workers=3):
+    run_id = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S") + "-" + uuid.uuid4().hex[:6]
+    state = load_state()
+    pending = selected_stages(stage_names)
+    results = {}
+    started_at = datetime.now(timezone.utc).isoformat()
+    run_start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        running = {}
+        while pending or running:
+            for name in list(pending):
+                deps = [d for d in STAGES[name]["deps"] if d in results or d in pending or d in running.values()]
+                if any(results.get(d, {}).get("status") in ("failed", "blocked") for d in deps):
+                    results[name] = {"status": "blocked"}
+                    pending.remove(name)
+                elif all(results.get(d, {}).get("status") in ("success", "skipped") for d in deps):
+                    running[pool.submit(execute_stage, name, run_id, state, force)] = name
+                    pending.remove(name)
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    results[name] = {"status": "failed", "error": str(e)}
+                res = results[name]
+                if res["status"] == "success":
+                    state[name] = res["fingerprint"]
+                    save_state(state)
+                print(f"[{name}] {res['status']}"
+                      + (f" in {res['wall_s']}s (cpu {res['cpu_s']}s, peak RSS {res['peak_rss_mb']} MB)" if "wall_s" in res else ""),
+                      flush=True)
+
+    record = {
+        "run_id": run_id,
+        "started_at": started_at,
+        "wall_s": round(time.perf_counter() - run_start, 3),
+        "stages": results,
+    }
+    os.makedirs(os.path.dirname(HISTORY_PATH), exist_ok=True)
+    with open(HISTORY_PATH, "a") as f:
+        f.write(json.dumps(record) + "\n")
+    print(f"Run {run_id} recorded in {os.path.relpath(HISTORY_PATH, REPO_ROOT)}")
+    return record
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stages", nargs="*", help="run only these stages (and their upstream dependencies)")
+    parser.add_argument("--force", action="store_true", help="run stages even if their inputs are unchanged")
+    parser.add_argument("--workers", type=int, default=3, help="maximum stages running at once")
+    args = parser.parse_args()
+
+    record = run_pipeline(args.stages, force=args.force, workers=args.workers)
+    failed = [s for s, r in record["stages"].items() if r["status"] in ("failed", "blocked")]
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+"""Stream orders and events into the online feature layer.
+
+Reads NDJSON records from a tailed file (``--file``, resuming from the offset
+committed together with the data) or from stdin (``--stdin``, e.g. piped from a
+queue consumer). A reader thread feeds a local queue; the main loop drains it
+in micro-batches (``--batch-size`` records or ``--flush-seconds``) and applies
+each batch in one transaction:
+  * orders are upserted into online.orders (status changes overwrite),
+  * sessions are inserted once into online.sessions; newly seen ones bump
+    sessions_started on their first day (sessions the batch layer already has
+    in fct_sessions are left to the rollup),
+  * events increment the per-(user, day) counters in online.user_event_days,
+  * the stream clock and file offset advance in online.stream_state.
+
+Records on or before the batch cutoff (last day of int_user_daily_activity)
+are skipped, since the rollup already counts them; when dbt advances the cutoff
+the covered online rows are compacted away. The API reads the result through
+ml/inference/online_features.py.
+
+Record shapes (TheLook column names; "type" may be omitted for orders with an order_id):
+    {"type": "order", "order_id": 1, "user_id": 7, "status": "Processing", "created_at": "2024-01-18T10:00:00"}
+    {"type": "event", "user_id": 7, "session_id": "abc", "event_type": "cart", "created_at": "2024-01-18T10:01:00"}
+
+Usage:
+    python pipelines/streaming/ingest_stream.py --file data/stream/activity.ndjson [--follow]
+    some-queue-consumer | python pipelines/streaming/ingest_stream.py --stdin
+"""
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from sqlalchemy import create_engine, text
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+from ml.inference.online_features import batch_cutoff, compact, ensure_online_tables
+
+# Database Connection
+db_user = os.getenv('POSTGRES_USER', 'user')
+db_pass = os.getenv('POSTGRES_PASSWORD', 'password')
+db_host = os.getenv('POSTGRES_HOST', 'postgres')
+db_port = os.getenv('POSTGRES_PORT', '5432')
+db_name = os.getenv('POSTGRES_DB', 'ecom')
+
+connection_str = f"postgresql+psycopg2://{db_user}:{db_pass}@{db_host}:{db_port}/{db_name}"
+engine = create_engine(connection_str)
+
+EVENT_COUNTERS = {"product": "view_count", "cart": "cart_count", "purchase": "purchase_event_count"}
+COUNTER_COLUMNS = ["event_count", "view_count", "cart_count", "purchase_event_count", "sessions_started"]
+END = object()
+
+
+def parse_timestamp(value):
+    ts = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+def read_file(path, offset, follow, out, poll_seconds=0.5):
+    """Put (record_line, offset_after_line) on ``out``; only complete lines are consumed."""
+    with open(path, "rb") as f:
+        f.seek(offset)
+        while True:
+            line = f.readline()
+            if line.endswith(b"\n"):
+                out.put((line, f.tell()))
+                continue
+            # EOF or a partially written line: rewind to its start and wait for more
+            f.seek(-len(line), os.SEEK_CUR)
+            if not follow:
+                break
+            time.sleep(poll_seconds)
+    out.put(END)
+
+
+def read_stdin(out):
+    for line in sys.stdin.buffer:
+        out.put((line, None))
+    out.put(END)
+
+
+def upsert_orders(conn, orders):
+    if not orders:
+        return
+    conn.execute(text("""
+        INSERT INTO online.orders (order_id, user_id, status, created_at)
+        VALUES (:order_id, :user_id, :status, :created_at)
+        ON CONFLICT (order_id) DO UPDATE SET status = excluded.status
+    """), list(orders.values()))
+
+
+def insert_sessions(conn, sessions):
+    """Insert first-seen sessions; returns [(user_id, start_date)] for the ones that are new.
+
+    Sessions already in fct_sessions started on or before the cutoff and are counted by the
+    rollup's sessions_started, so late events for them must not count them again.
+    """
+    if not sessions:
+        return []
+    ids = list(sessions)
+    result = conn.execute(text("""
+        INSERT INTO online.sessions (session_id, user_id, started_at)
+        SELECT s.* FROM unnest(CAST(:ids AS text[]), CAST(:users AS bigint[]), CAST(:starts AS timestamp[]))
+            AS s (session_id, user_id, started_at)
+        WHERE NOT EXISTS (SELECT 1 FROM public_marts.fct_sessions f WHERE f.session_id = s.session_id)
+        ON CONFLICT (session_id) DO NOTHING
+        RETURNING user_id, started_at::date
+    """), {"ids": ids, "users": [sessions[s][0] for s in ids], "starts": [sessions[s][1] for s in ids]})
+    return result.fetchall()
+
+
+def add_event_counters(conn, counters):
+    if not counters:
+        return
+    keys = list(counters)
+    params = {"users": [k[0] for k in keys], "days": [k[1] for k in keys]}
+    for i, col in enumerate(COUNTER_COLUMNS):
+        params[col] = [counters[k][i] for k in keys]
+    updates = ", ".join(f"{col} = d.{col} + excluded.{col}" for col in COUNTER_COLUMNS)
+    conn.execute(text(f"""
+        INSERT INTO online.user_event_days AS d (user_id, activity_date, {", ".join(COUNTER_COLUMNS)})
+        SELECT * FROM unnest(CAST(:users AS bigint[]), CAST(:days AS date[]),
+                             {", ".join(f"CAST(:{col} AS bigint[])" for col in COUNTER_COLUMNS)})
+        ON CONFLICT (user_id, activity_date) DO UPDATE SET {updates}, updated_at = now()
+    """), params)
+
+
+def apply_batch(conn, lines, cutoff, source, offset):
+    orders = {}
+    sessions = {}
+    counters = defaultdict(lambda: [0] * len(COUNTER_COLUMNS))
+    clock = None
+    skipped = bad = 0
+    for line in lines:
+        try:
+            rec = json.loads(line)
+            created = parse_timestamp(rec["created_at"])
+            user_id = int(rec["user_id"])
+            kind = rec.get("type", "order" if "order_id" in rec else "event")
+            order_id = int(rec["order_id"]) if kind == "order" else None
+        except (ValueError, KeyError, TypeError):
+            bad += 1
+            continue
+        if cutoff is not None and created.date() <= cutoff:
+            skipped += 1
+            continue
+        clock = created if clock is None else max(clock, created)
+        if kind == "order":
+            orders[order_id] = {"order_id": order_id, "user_id": user_id,
+                                "status": rec.get("status"), "created_at": created}
+            continue
+        day = counters[(user_id, created.date())]
+        day[0] += 1
+        counter = EVENT_COUNTERS.get(rec.get("event_type"))
+        if counter:
+            day[COUNTER_COLUMNS.index(counter)] += 1
+        session_id = rec.get("session_id")
+        if session_id is not None:
+            session_id = str(session_id)
+            if session_id not in sessions or created < sessions[session_id][1]:
+                sessions[session_id] = (user_id, created)
+
+    upsert_orders(conn, orders)
+    for user_id, start_date in insert_sessions(conn, sessions):
+        counters[(user_id, start_date)][COUNTER_COLUMNS.index("sessions_started")] += 1
+    add_event_counters(conn, counters)
+    conn.execute(text("""
+        INSERT INTO online.stream_state (source, file_offset, stream_clock)
+        VALUES (:source, :offset, :clock)
+        ON CONFLICT (source) DO UPDATE SET
+            file_offset = coalesce(excluded.file_offset, online.stream_state.file_offset),
+            stream_clock = greatest(online.stream_state.stream_clock, excluded.stream_clock),
+            updated_at = now()
+    """), {"source": source, "offset": offset, "clock": clock})
+    return {"orders": len(orders), "event_days": len(counters), "skipped": skipped, "bad": bad}
+
+
+def stored_offset(source):
+    with engine.connect() as conn:
+        row = conn.execute(text("SELECT file_offset FROM online.stream_state WHERE source = :source"),
+                           {"source": source}).fetchone()
+    return row[0] if row and row[0] is not None else 0
+
+
+def run(args):
+    ensure_online_tables(engine)
+    records = queue.Queue(maxsize=args.batch_size * 4)
+    if args.stdin:
+        source = "stdin"
+        reader = threading.Thread(target=read_stdin, args=(records,), daemon=True)
+    else:
+        source = os.path.abspath(args.file)
+        offset = 0 if args.from_start else stored_offset(source)
+        print(f"Reading {source} from offset {offset}{' (following)' if args.follow else ''}...")
+        reader = threading.Thread(target=read_file, args=(source, offset, args.follow, records), daemon=True)
+    reader.start()
+
+    with engine.begin() as conn:
+        cutoff = batch_cutoff(conn)
+    cutoff_checked = time.monotonic()
+    print(f"Batch cutoff: {cutoff}")
+
+    done = False
+    while not done:
+        batch, offset = [], None
+        deadline = time.monotonic() + args.flush_seconds
+        while len(batch) < args.batch_size:
+            try:
+                item = records.get(timeout=max(deadline - time.monotonic(), 0.01))
+            except queue.Empty:
+                break
+            if item is END:
+                done = True
+                break
+            batch.append(item[0])
+            offset = item[1]
+
+        with engine.begin() as conn:
+            if time.monotonic() - cutoff_checked > args.cutoff_refresh_seconds:
+                new_cutoff = batch_cutoff(conn)
+                if new_cutoff is not None and (cutoff is None or new_cutoff > cutoff):
+                    print(f"Batch cutoff advanced to {new_cutoff}; compacting online tables.")
+                    compact(conn, new_cutoff)
+                    cutoff = new_cutoff
+                cutoff_checked = time.monotonic()
+            if batch:
+                started = time.perf_counter()
+                stats = apply_batch(conn, batch, cutoff, source, offset)
+                print(f"Applied {len(batch)} records in {(time.perf_counter() - started) * 1000:.0f} ms: {stats}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    src = parser.add_mutually_exclusive_group(required=True)
+    src.add_argument("--file", help="NDJSON file to read (resumes from the committed offset)")
+    src.add_argument("--stdin", action="store_true", help="read NDJSON records from stdin")
+    parser.add_argument("--follow", action="store_true", help="keep tailing the file for new records")
+    parser.add_argument("--from-start", action="store_true", help="ignore the committed file offset")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--flush-seconds", type=float, default=1.0)
+    parser.add_argument("--cutoff-refresh-seconds", type=float, default=60.0)
+    run(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
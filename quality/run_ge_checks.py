@@ -1,5 +1,11 @@
 import great_expectations as gx
 import great_expectations.expectations as gxe
+from sqlalchemy import create_engine, text
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import argparse
+import hashlib
+import json
 import os
 import sys
 
@@ -11,18 +17,83 @@ db_port = os.getenv('POSTGRES_PORT', '5432')
 db_name = os.getenv('POSTGRES_DB', 'ecom')
 
 connection_string = f"postgresql+psycopg2://{db_user}:{db_pass}@{db_host}:{db_port}/{db_name}"
+engine = create_engine(connection_string)
 
-def add_validation(context, ds, asset_name, table_name, schema_name, suite_name, expectations):
+# Result cache: a validation whose table fingerprint and suite are unchanged reuses its last result
+CACHE_PATH = os.getenv("GE_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".ge_cache.json"))
+
+# Tables under validation. ts_column feeds the fingerprint and the "recent" scoped mode.
+TABLE_CHECKS = [
+    {
+        # 1. Raw Users Check
+        "asset_name": "raw_users", "table_name": "users", "schema_name": "raw",
+        "suite_name": "users_suite", "ts_column": "created_at",
+        "row_count": (1, 10000000),
+        "expectations": lambda: [
+            gxe.ExpectColumnValuesToBeUnique(column="id"),
+            gxe.ExpectColumnValuesToNotBeNull(column="email", mostly=0.9)
+        ],
+    },
+    {
+        # 2. Churn Features Check (Sprint 1)
+        "asset_name": "churn_features", "table_name": "churn_features", "schema_name": "public_marts",
+        "suite_name": "churn_features_suite", "ts_column": "snapshot_date",
+        "row_count": (1000, 1000000), # Expect at least 1k users
+        "expectations": lambda: [
+            gxe.ExpectColumnValuesToBeUnique(column="user_id"),
+            gxe.ExpectColumnValuesToNotBeNull(column="recency_days"),
+            gxe.ExpectColumnValuesToNotBeNull(column="frequency_60d")
+        ],
+    },
+]
+
+def table_fingerprint(check):
+    relation = f"{check['schema_name']}.{check['table_name']}"
+    with engine.connect() as conn:
+        row = conn.execute(text(
+            f"SELECT count(*), max({check['ts_column']})::text, pg_total_relation_size('{relation}') FROM {relation}"
+        )).fetchone()
+    return {"row_count": row[0], "max_ts": row[1], "relation_size": row[2]}
+
+def load_cache():
+    if not os.path.exists(CACHE_PATH):
+        return {}
+    with open(CACHE_PATH) as f:
+        return json.load(f)
+
+def save_cache(cache):
+    with open(CACHE_PATH, "w") as f:
+        json.dump(cache, f, indent=2)
+
+def suite_hash(expectations, mode_key):
+    payload = mode_key + "|" + "|".join(repr(exp) for exp in expectations)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+def scoped_query(check, mode, sample_percent, recent_days):
+    relation = f"{check['schema_name']}.{check['table_name']}"
+    if mode == "sample":
+        # Block sampling: reads ~sample_percent of the pages instead of the whole table
+        return f"SELECT * FROM {relation} TABLESAMPLE SYSTEM ({sample_percent})"
+    if mode == "recent":
+        # Only the newest rows; on the month-partitioned raw tables this prunes to the latest partitions
+        ts = check['ts_column']
+        return f"SELECT * FROM {relation} WHERE {ts} >= (SELECT max({ts}) FROM {relation}) - interval '{recent_days} days'"
+    return None
+
+def add_validation(context, ds, asset_name, table_name, schema_name, suite_name, expectations, query=None):
     # Get/Add Asset
     try:
         asset = ds.get_asset(asset_name)
     except:
-        asset = ds.add_table_asset(
-            name=asset_name,
-            table_name=table_name,
-            schema_name=schema_name
-        )
-        
+        if query is not None:
+            asset = ds.add_query_asset(name=asset_name, query=query)
+        else:
+            asset = ds.add_table_asset(
+                name=asset_name,
+                table_name=table_name,
+                schema_name=schema_name
+            )
+
     # Get/Add Batch Def
     batch_def_name = f"{asset_name}_batch_def"
     try:
@@ -37,7 +108,7 @@ def add_validation(context, ds, asset_name, table_name, schema_name, suite_name,
         suite = context.suites.add(gx.ExpectationSuite(name=suite_name))
         for exp in expectations:
             suite.add_expectation(exp)
-            
+
     # Get/Add Val Def
     val_def_name = f"{asset_name}_validation"
     try:
@@ -48,10 +119,26 @@ def add_validation(context, ds, asset_name, table_name, schema_name, suite_name,
         )
     return val_def
 
+def run_validation(val_def):
+    result = val_def.run()
+    failed = [str(r.expectation_config.type) for r in result.results if not r.success]
+    return {"success": bool(result.success), "failed_expectations": failed}
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Great Expectations quality gate")
+    parser.add_argument("--mode", choices=["full", "sample", "recent"], default=os.getenv("GE_MODE", "full"),
+                        help="full table, TABLESAMPLE block sample, or only the last --recent-days of rows")
+    parser.add_argument("--sample-percent", type=float, default=float(os.getenv("GE_SAMPLE_PERCENT", "10")))
+    parser.add_argument("--recent-days", type=int, default=int(os.getenv("GE_RECENT_DAYS", "31")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("GE_WORKERS", "4")))
+    parser.add_argument("--force", action="store_true", help="ignore cached results and re-validate everything")
+    return parser.parse_args()
+
 def run_quality_check():
-    print("Starting Great Expectations Check (GE 1.10.0 API)...")
+    args = parse_args()
+    print(f"Starting Great Expectations Check (GE 1.10.0 API, mode={args.mode})...")
     context = gx.get_context()
-    
+
     # Datasource
     datasource_name = "my_postgres"
     try:
@@ -62,54 +149,65 @@ def run_quality_check():
             connection_string=connection_string
         )
 
-    validations_to_run = []
+    cache = load_cache()
+    results = {}
+    to_run = {}
+    mode_key = args.mode if args.mode == "full" else f"{args.mode}_{args.sample_percent if args.mode == 'sample' else args.recent_days}"
 
-    # 1. Raw Users Check
-    validations_to_run.append(add_validation(
-        context, ds, "raw_users", "users", "raw", "users_suite",
-        [
-            gxe.ExpectTableRowCountToBeBetween(min_value=1, max_value=10000000),
-            gxe.ExpectColumnValuesToBeUnique(column="id"),
-            gxe.ExpectColumnValuesToNotBeNull(column="email", mostly=0.9)
-        ]
-    ))
-
-    # 2. Churn Features Check (Sprint 1)
-    validations_to_run.append(add_validation(
-        context, ds, "churn_features", "churn_features", "public_marts", "churn_features_suite",
-        [
-            gxe.ExpectTableRowCountToBeBetween(min_value=1000, max_value=1000000), # Expect at least 1k users
-            gxe.ExpectColumnValuesToBeUnique(column="user_id"),
-            gxe.ExpectColumnValuesToNotBeNull(column="recency_days"),
-            gxe.ExpectColumnValuesToNotBeNull(column="frequency_60d")
-        ]
-    ))
+    for check in TABLE_CHECKS:
+        asset_name = check["asset_name"]
+        fingerprint = table_fingerprint(check)
+        expectations = check["expectations"]()
 
-    # Checkpoint
-    checkpoint_name = "ecom_checkpoint"
-    try:
-        checkpoint = context.checkpoints.get(checkpoint_name)
-        # Update endpoint definitions if needed, but easiest to just reuse or recreate.
-        # Checkpoint definitions are additive if we are careful, but here let's simplify.
-        # Ideally we update the validation_definitions list.
-        checkpoint.validation_definitions = validations_to_run
-    except:
-        checkpoint = context.checkpoints.add(
-            gx.Checkpoint(name=checkpoint_name, validation_definitions=validations_to_run)
+        # The row count is known exactly from the fingerprint, so it is checked here in every mode
+        lo, hi = check["row_count"]
+        row_count_ok = lo <= fingerprint["row_count"] <= hi
+        if not row_count_ok:
+            print(f"{asset_name}: row count {fingerprint['row_count']} outside [{lo}, {hi}]")
+
+        key = suite_hash(expectations, mode_key)
+        cached = cache.get(asset_name)
+        if not args.force and cached and cached["fingerprint"] == fingerprint and cached["suite_hash"] == key:
+            print(f"{asset_name}: unchanged since {cached['checked_at']}, reusing cached result (success={cached['success']})")
+            results[asset_name] = dict(cached, success=cached["success"] and row_count_ok)
+            continue
+
+        query = scoped_query(check, args.mode, args.sample_percent, args.recent_days)
+        scoped_asset = asset_name if query is None else f"{asset_name}_{mode_key}".replace(".", "_")
+        suite_name = check["suite_name"] if query is None else f"{check['suite_name']}_{mode_key}".replace(".", "_")
+        # GE context mutation is not thread-safe: register everything before running in parallel
+        val_def = add_validation(
+            context, ds, scoped_asset, check["table_name"], check["schema_name"], suite_name, expectations, query=query
         )
+        to_run[asset_name] = (val_def, fingerprint, key, row_count_ok)
+
+    # Run independent validations concurrently
+    if to_run:
+        print(f"Running {len(to_run)} validation(s) with {args.workers} worker(s)...")
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            futures = {name: pool.submit(run_validation, item[0]) for name, item in to_run.items()}
+        for name, future in futures.items():
+            _, fingerprint, key, row_count_ok = to_run[name]
+            outcome = future.result()
+            cache[name] = {
+                "fingerprint": fingerprint,
+                "suite_hash": key,
+                "mode": mode_key,
+                "success": outcome["success"],
+                "failed_expectations": outcome["failed_expectations"],
+                "checked_at": datetime.now(timezone.utc).isoformat(),
+            }
+            results[name] = dict(cache[name], success=outcome["success"] and row_count_ok)
+        save_cache(cache)
 
-    # Run
-    print("Running Checkpoint...")
-    results = checkpoint.run()
-    
-    success = results.success
+    success = all(r["success"] for r in results.values())
     print(f"Overall Success: {success}")
-    
+
     if not success:
         print("Data Quality Check FAILED!")
-        for res in results.run_results.values():
+        for name, res in results.items():
             if not res["success"]:
-                print(f"Failed Validation: {res.meta}")
+                print(f"Failed Validation: {name} {res['failed_expectations']}")
         sys.exit(1)
     else:
         print("Data Quality Check PASSED!")
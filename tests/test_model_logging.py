@@ -0,0 +1,46 @@
+"""Categorical boosters must survive an MLflow log/load round-trip.
+
+The legacy ``.xgb`` binary format cannot store categorical splits, so the
+training scripts log with ``model_format="ubj"``; this guards that path.
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+from ml.feature_spec import NUMERIC_FEATURES, TARGET, build_spec, encode, load_model_dir, predict_proba
+
+mlflow = pytest.importorskip("mlflow")
+xgb = pytest.importorskip("xgboost")
+
+
+def categorical_booster():
+    rng = np.random.default_rng(0)
+    n = 500
+    df = pd.DataFrame({col: rng.integers(0, 50, n) for col in NUMERIC_FEATURES})
+    df["traffic_source"] = rng.choice(["Search", "Email", "Facebook", "Organic"], n)
+    df["country"] = rng.choice(["US", "China", "Brasil"], n)
+    df["gender"] = rng.choice(["M", "F"], n)
+    df[TARGET] = ((df["traffic_source"] == "Email") ^ (rng.random(n) < 0.2)).astype(int)
+    X = encode(df, build_spec(df))
+    model = xgb.XGBClassifier(max_depth=4, n_estimators=10, tree_method="hist", enable_categorical=True)
+    model.fit(X, df[TARGET])
+    return model.get_booster(), X
+
+
+def test_categorical_booster_logs_and_reloads(tmp_path):
+    import mlflow.xgboost
+
+    booster, X = categorical_booster()
+    mlflow.set_tracking_uri(f"file://{tmp_path}/mlruns")
+    with mlflow.start_run():
+        mlflow.xgboost.log_model(booster, "model", model_format="ubj")
+        model_uri = f"runs:/{mlflow.active_run().info.run_id}/model"
+
+    local_dir = mlflow.artifacts.download_artifacts(artifact_uri=model_uri)
+    assert "model.ubj" in os.listdir(local_dir)
+    reloaded, _ = load_model_dir(local_dir)
+    np.testing.assert_array_equal(predict_proba(reloaded, X), predict_proba(booster, X))